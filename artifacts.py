@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+from forkaware import ForkAware
+from metrics import stage
+
+# Níveis de gravação das imagens intermediárias (depuração/auditoria)
+LEVELS = ("off", "sampled", "all")
+DEFAULT_SAMPLE_EVERY = 20
+DEFAULT_QUEUE_SIZE = 16
+_sink = None
+
+
+class ArtifactSink(ForkAware):
+    """
+    Destino central das imagens intermediárias (_gray, _edges, _L, _M...).
+
+    A codificação e a gravação rodam numa thread de fundo alimentada por uma
+    fila limitada, então a medição não espera pelo imwrite. Se a fila encher,
+    save() espera por espaço (block=True) ou descarta a imagem e conta em
+    self.dropped (block=False).
+
+    Níveis:
+    - 'off': nada é gravado (nem copiado)
+    - 'sampled': grava as imagens de uma peça a cada sample_every
+    - 'all': grava tudo
+
+    No nível 'sampled' as peças são distinguidas pelo parâmetro source de
+    save()/wants() (normalmente o caminho da imagem original): chamadas
+    seguidas com o mesmo source pertencem à mesma peça.
+
+    :param level: 'off', 'sampled' ou 'all'
+    :param sample_every: Intervalo (em peças) do nível 'sampled'
+    :param queue_size: Número máximo de imagens aguardando gravação
+    :param block: Se False, descarta as imagens quando a fila está cheia
+    """
+
+    def __init__(self, level="all", sample_every=DEFAULT_SAMPLE_EVERY, queue_size=DEFAULT_QUEUE_SIZE, block=True):
+        if level not in LEVELS:
+            raise ValueError(f"Nível de gravação desconhecido: {level} (disponíveis: {', '.join(LEVELS)})")
+        self.level = level
+        self.sample_every = max(1, int(sample_every))
+        self.queue_size = queue_size
+        self.block = block
+        self.written = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._source = None
+        self._count = 0
+        self._selected = False
+        self._queue = None
+        self._thread = None
+
+    def wants(self, source=None):
+        """
+        Indica se as imagens da peça 'source' serão gravadas. Permite pular o
+        desenho de imagens de anotação que seriam descartadas.
+        """
+        if self.level == "off":
+            return False
+        if self.level == "all":
+            return True
+        with self._lock:
+            if source is None or source != self._source:
+                self._source = source
+                self._selected = self._count % self.sample_every == 0
+                self._count += 1
+            return self._selected
+
+    def save(self, path, image, source=None, copy=True):
+        """
+        Agenda a gravação de uma imagem.
+
+        :param path: Caminho de saída (a extensão define o formato)
+        :param image: Imagem (array)
+        :param source: Identificador da peça, usado no nível 'sampled'
+        :param copy: Se False, o chamador garante que a imagem não será mais alterada
+        :return: O caminho, se a imagem foi agendada, ou None
+        """
+        if not path or image is None or not self.wants(source):
+            return None
+        # A thread não sobrevive ao fork: cada processo (ex.: pool do batch) cria a sua
+        self._check_process()
+        item = (path, np.array(image, copy=True) if copy else image)
+        try:
+            self._queue.put(item, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return path
+
+    def flush(self):
+        """Espera a gravação de todas as imagens agendadas."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _start_process(self, forked):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                        name="ArtifactWriter", daemon=True)
+        self._thread.start()
+
+    def _at_exit(self):
+        self.flush()
+
+    def _run(self, pending):
+        while True:
+            path, image = pending.get()
+            try:
+                with stage("imwrite", image):
+                    ok = cv2.imwrite(path, image)
+                if ok:
+                    self.written += 1
+                else:
+                    print(f"Erro: não foi possível gravar {path}")
+            except cv2.error as exc:
+                print(f"Erro ao gravar {path}: {exc}")
+            finally:
+                pending.task_done()
+
+
+def open_sink(spec=None):
+    """
+    Cria o destino de imagens a partir de uma especificação 'nível[:intervalo]'.
+
+    :param spec: 'off', 'all', 'sampled' ou 'sampled:N'; se None, usa a variável
+                 de ambiente SIZEIT_ARTIFACTS (padrão 'all')
+    """
+    spec = spec or os.environ.get("SIZEIT_ARTIFACTS", "all")
+    level, _, every = spec.partition(":")
+    return ArtifactSink(level, sample_every=int(every) if every else DEFAULT_SAMPLE_EVERY)
+
+
+def get_sink():
+    """Destino de imagens do processo, criado no primeiro uso (ver open_sink)."""
+    global _sink
+    if _sink is None:
+        _sink = open_sink()
+    return _sink
+
+
+def set_sink(sink):
+    """Troca o destino de imagens (ex.: ArtifactSink('off') em produção)."""
+    global _sink
+    if _sink is not None:
+        _sink.flush()
+    _sink = sink
+
+
+def save_artifact(path, image, source=None, copy=True):
+    """Agenda a gravação de uma imagem intermediária no destino do processo."""
+    return get_sink().save(path, image, source=source, copy=copy)
+
+
+def flush_artifacts():
+    """Espera a gravação das imagens pendentes."""
+    if _sink is not None:
+        _sink.flush()
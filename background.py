@@ -1,23 +1,65 @@
 import cv2
 import numpy as np
 import os
-from rembg import remove
+from rembg import new_session, remove
 
-def remove_background(image_path):
+# Modelo do rembg e sessão de inferência compartilhada pelo processo
+MODEL_NAME = "u2net"
+_sessions = {}
+
+def get_session(model_name=MODEL_NAME):
+    """
+    Sessão de inferência do rembg, criada uma única vez por processo e
+    reaproveitada em todas as imagens (carregar o U²-Net é a parte mais cara).
+    """
+    if model_name not in _sessions:
+        _sessions[model_name] = new_session(model_name)
+    return _sessions[model_name]
+
+def predict_mask(image, session=None, max_side=None):
+    """
+    Máscara de primeiro plano (alfa) de uma imagem BGR em memória.
+
+    :param image: Imagem BGR
+    :param session: Sessão do rembg (padrão: get_session())
+    :param max_side: Se informado, a inferência roda numa cópia reduzida com este
+                     maior lado e a máscara volta à resolução original
+    :return: Máscara uint8 (0-255) do tamanho da imagem
+    """
+    session = session or get_session()
+    h, w = image.shape[:2]
+
+    # O U²-Net trabalha em 320x320: reduzir antes evita pré/pós-processar a imagem inteira
+    scale = min(1.0, max_side / max(h, w)) if max_side else 1.0
+    small = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    mask = np.asarray(remove(rgb, session=session, only_mask=True), dtype=np.uint8)
+    if mask.ndim == 3:
+        mask = mask[:, :, -1]
+
+    if mask.shape[:2] != (h, w):
+        mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_LINEAR)
+    return mask
+
+def apply_mask(image, mask):
+    """Imagem BGRA com a máscara no canal alfa (fundo transparente)."""
+    image_bgra = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    image_bgra[:, :, 3] = mask
+    return image_bgra
+
+def remove_background(image_path, session=None, max_side=None):
     """Remove automaticamente o fundo da imagem usando rembg (U²-Net)."""
-    
+
     if not os.path.exists(image_path):
         print(f"Erro: Arquivo '{image_path}' não encontrado.")
         return
-    
+
     # Carregar imagem original
     image = cv2.imread(image_path)
 
-    # Converter para RGBA antes de processar
-    image_rgba = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
-
-    # Aplicar remoção de fundo com U²-Net (rembg)
-    output = remove(image_rgba)
+    # Aplicar remoção de fundo com U²-Net (rembg), reaproveitando a sessão do processo
+    output = apply_mask(image, predict_mask(image, session, max_side))
 
     # Salvar resultado
     base_name, _ = os.path.splitext(image_path)
@@ -25,8 +67,24 @@ def remove_background(image_path):
     cv2.imwrite(output_path, output)
 
     print(f"Fundo removido com sucesso! Imagem salva em: {output_path}")
-    
+
     return output_path
 
-image_path = r"C:\Users\alexandre.panosso\Dropbox\DPro\Microdont\09_Automacao_2025\AMOSTRAS DOS 09 LOTES EOCA\135183\1_2069_135183.jpg"
-remove_background(image_path)
\ No newline at end of file
+def remove_background_batch(image_paths, model_name=MODEL_NAME, max_side=None):
+    """
+    Remove o fundo de uma lista de imagens com uma única sessão de inferência.
+
+    É um gerador: cada caminho de saída (ou None, se a imagem não existir) é
+    entregue assim que fica pronto, para que a etapa seguinte comece sem
+    esperar o lote inteiro.
+
+    :param max_side: Maior lado usado na inferência (ver predict_mask); None usa a resolução total
+    """
+    session = get_session(model_name)
+    for image_path in image_paths:
+        yield remove_background(image_path, session, max_side)
+
+
+if __name__ == "__main__":
+    image_path = r"C:\Users\alexandre.panosso\Dropbox\DPro\Microdont\09_Automacao_2025\AMOSTRAS DOS 09 LOTES EOCA\135183\1_2069_135183.jpg"
+    remove_background(image_path)
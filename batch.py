@@ -0,0 +1,134 @@
+import argparse
+import csv
+import os
+import sys
+
+import sizeitCalibration as sc
+from batchutil import collect_images, run_pool
+from measurement_log import open_store
+from metrics import open_profiler, set_profiler
+from segmentation import BACKENDS, segment_piece
+
+# Rastreador de ROI de cada processo do pool (imagens do mesmo dispositivo)
+_roi_tracker = None
+
+
+def measure_part(image_path, pixel_to_mm_ratio, num_stations=10, mode="contour", subpixel=False, roi=False,
+                 backend=None):
+    """
+    Alinha e mede uma peça (executado em um processo do pool).
+
+    :param roi: Se True, reaproveita a posição da peça da imagem anterior do mesmo
+                processo e analisa só essa região (RoiTracker)
+    :param backend: Método de segmentação (ver segmentation.BACKENDS); None usa o Canny do PieceAnalysis
+    :return: Dicionário com imagem, comprimento e lista de (posição, diâmetro) em mm
+    """
+    global _roi_tracker
+    result = {"image": image_path, "length_mm": None, "diameters": [], "error": None}
+    try:
+        source = image_path
+        if backend:
+            source = segment_piece(image_path, backend)
+        elif roi:
+            if _roi_tracker is None:
+                _roi_tracker = sc.RoiTracker()
+            source = _roi_tracker.analyze(image_path)
+            if source is None:
+                result["error"] = "Nenhum contorno detectado"
+                return result
+        result = sc.measure_piece(source, pixel_to_mm_ratio, num_stations, mode, subpixel)
+    except Exception as exc:  # Uma imagem ruim não deve derrubar o lote inteiro
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def run_batch(image_paths, pixel_to_mm_ratio, output_path=None, workers=None, num_stations=10,
+              mode="contour", subpixel=False, roi=False, backend=None):
+    """
+    Mede todas as imagens em um pool de processos, gravando cada resultado
+    assim que fica pronto.
+
+    :param output_path: CSV de saída (uma linha por estação); None imprime apenas no console
+    :param workers: Número de processos (padrão: número de núcleos)
+    :return: Lista de resultados na ordem de conclusão
+    """
+    output_file = open(output_path, "w", newline="") if output_path else None
+    writer = csv.writer(output_file) if output_file else None
+    if writer:
+        writer.writerow(["Imagem", "Comprimento_mm", "Posicao_mm", "Diametro_mm", "Erro"])
+
+    def write_result(result):
+        rows = result["diameters"] or [(None, None)]
+        for position, diameter in rows:
+            writer.writerow([result["image"], result["length_mm"], position, diameter, result["error"]])
+        output_file.flush()
+
+    try:
+        results = run_pool(measure_part, image_paths,
+                           (pixel_to_mm_ratio, num_stations, mode, subpixel, roi, backend), workers,
+                           describe=lambda result: f"{result['length_mm']:.3f}mm, "
+                                                   f"{len(result['diameters'])} diâmetros",
+                           on_result=write_result if writer else None)
+    finally:
+        if output_file:
+            output_file.close()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede em lote todas as peças de um diretório ou padrão glob.")
+    parser.add_argument("inputs", nargs="+", help="Diretórios, arquivos ou padrões glob das imagens das peças")
+    parser.add_argument("--calib", help="Imagem de calibração (padrão: relação salva em config.json)")
+    parser.add_argument("--profile", default="default", help="Perfil de câmera/lente no cache de calibração")
+    parser.add_argument("--pyramid", type=int, default=0, help="Níveis da busca em pirâmide na calibração (0 = resolução total)")
+    parser.add_argument("--output", "-o", help="CSV de saída com uma linha por estação")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="Número de processos (padrão: núcleos)")
+    parser.add_argument("--stations", type=int, default=10, help="Número de estações de diâmetro por peça")
+    parser.add_argument("--mode", choices=("contour", "warp"), default="contour", help="Modo de alinhamento")
+    parser.add_argument("--subpixel", action="store_true", help="Refinar as bordas em nível sub-pixel")
+    parser.add_argument("--roi", action="store_true", help="Processar apenas a região da peça, acompanhada entre imagens")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="Método de segmentação da peça (padrão: Canny + maior contorno)")
+    parser.add_argument("--store", help="Destino do histórico: 'csv[:arquivo]' ou 'sqlite[:arquivo.db]'")
+    parser.add_argument("--metrics", help="Exporta os tempos por etapa ao final ('.json' ou '.prom' do Prometheus)")
+    parser.add_argument("--metrics-memory", action="store_true", help="Mede também o pico de memória por etapa (mais lento)")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        # A variável de ambiente faz os processos do pool usarem o mesmo destino
+        os.environ["SIZEIT_STORE"] = args.store
+        sc.set_measurement_store(open_store(args.store))
+
+    if args.metrics:
+        # As variáveis de ambiente fazem os processos do pool medirem também (um arquivo por processo)
+        os.environ["SIZEIT_METRICS"] = "memory" if args.metrics_memory else "time"
+        os.environ["SIZEIT_METRICS_FILE"] = args.metrics
+        set_profiler(open_profiler())
+
+    # Calibrar uma única vez para o lote inteiro
+    if args.calib:
+        pixel_to_mm_ratio = sc.calibrate_cached(args.calib, profile=args.profile, pyramid_levels=args.pyramid)
+    else:
+        pixel_to_mm_ratio = sc.load_calibration()
+    if not pixel_to_mm_ratio:
+        print("Erro: Falha na calibração. Verifique a imagem de referência ou o config.json.")
+        return 1
+
+    image_paths = collect_images(args.inputs)
+    if not image_paths:
+        print("Nenhuma imagem encontrada.")
+        return 1
+    print(f"{len(image_paths)} imagens, relação {pixel_to_mm_ratio:.3f} pixels/mm")
+
+    results = run_batch(image_paths, pixel_to_mm_ratio, args.output, args.workers, args.stations,
+                        args.mode, args.subpixel, args.roi, args.backend)
+    failures = sum(1 for result in results if result["error"])
+    print(f"Lote concluído: {len(results) - failures} medidas, {failures} falhas.")
+    if args.metrics:
+        print(f"Métricas por etapa em {args.metrics} (processo principal) e nos arquivos '-<pid>' de cada processo do pool.")
+    return 0 if not failures else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Extensões aceitas e sufixos de arquivos gerados pelo próprio SizeIT (ignorados)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+DERIVED_SUFFIXES = ("_ALIGN", "_L", "_M")
+
+
+def collect_images(inputs, exclude_suffixes=DERIVED_SUFFIXES):
+    """
+    Lista as imagens de peças a partir de diretórios e/ou padrões glob.
+
+    :param inputs: Lista de diretórios, arquivos ou padrões (ex.: 'lote/*.jpg')
+    :param exclude_suffixes: Sufixos (antes da extensão) das imagens derivadas ignoradas
+    :return: Lista ordenada de caminhos, sem duplicatas nem imagens derivadas
+    """
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            candidates = [os.path.join(entry, name) for name in os.listdir(entry)]
+        else:
+            candidates = glob.glob(entry)
+        for path in candidates:
+            base_name, ext = os.path.splitext(path)
+            if ext.lower() in IMAGE_EXTENSIONS and not base_name.endswith(exclude_suffixes):
+                paths.append(path)
+    return sorted(set(paths))
+
+
+def run_pool(func, image_paths, args=(), workers=None, describe=None, on_result=None):
+    """
+    Executa func(caminho, *args) para cada imagem em um pool de processos,
+    mostrando o progresso à medida que os resultados ficam prontos.
+
+    :param func: Função executada nos processos; devolve um dicionário com 'image' e 'error'
+    :param args: Argumentos adicionais de func
+    :param workers: Número de processos (padrão: número de núcleos)
+    :param describe: Resumo de um resultado sem erro para o console (padrão: 'ok')
+    :param on_result: Chamada no processo principal com cada resultado (ex.: gravar o CSV)
+    :return: Lista de resultados na ordem de conclusão
+    """
+    workers = workers or os.cpu_count() or 1
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, path, *args) for path in image_paths]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            if result["error"]:
+                print(f"[{done}/{len(futures)}] {result['image']}: ERRO {result['error']}")
+            else:
+                print(f"[{done}/{len(futures)}] {result['image']}: {describe(result) if describe else 'ok'}")
+            if on_result:
+                on_result(result)
+    return results
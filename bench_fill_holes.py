@@ -0,0 +1,83 @@
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+from watershed_engine import fill_holes, load_params, segment
+
+
+# Versões anteriores (watershed.py / watershed_2.py), em memória, apenas para comparação
+
+def fill_mask_legacy(mask):
+    """fill_mask / fill_holes_in_mask_old: floodFill do exterior + drawContours por contorno + fechamento."""
+    filled_mask = cv2.bitwise_not(mask)
+    h, w = mask.shape
+    floodfill_mask = np.zeros((h + 2, w + 2), np.uint8)
+    cv2.floodFill(filled_mask, floodfill_mask, (0, 0), 255)
+    solid_mask = cv2.bitwise_or(mask, cv2.bitwise_not(filled_mask))
+    contours, _ = cv2.findContours(solid_mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    for cnt in contours:
+        cv2.drawContours(solid_mask, [cnt], 0, 255, thickness=cv2.FILLED)
+    kernel = np.ones((5, 5), np.uint8)
+    return cv2.morphologyEx(solid_mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+
+def fill_holes_center_legacy(mask):
+    """fill_holes_in_mask: floodFill a partir do centro da imagem."""
+    filled_mask = mask.copy()
+    h, w = mask.shape
+    floodfill_mask = np.zeros((h + 2, w + 2), np.uint8)
+    cx, cy = w // 2, h // 2
+    if mask[cy, cx] == 0:
+        cv2.floodFill(filled_mask, floodfill_mask, (cx, cy), 255)
+    return cv2.bitwise_or(mask, cv2.bitwise_xor(filled_mask, mask))
+
+
+def _time(func, mask, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func(mask)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0, output
+
+
+def _agreement(a, b):
+    """Fração de pixels com o mesmo valor (peça/fundo) que o método equivalente."""
+    return float(np.mean((a > 127) == (b > 127)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara o preenchimento de buracos atual com as versões anteriores.")
+    parser.add_argument("images", nargs="+", help="Imagens dos lotes (a máscara é gerada pelo watershed_engine)")
+    parser.add_argument("--profile", default="default", help="Perfil de parâmetros do watershed")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições por método (vale o melhor tempo)")
+    args = parser.parse_args(argv)
+
+    params = load_params(args.profile)
+    # (nome, função, função de referência para a concordância)
+    methods = [
+        ("fill_mask / fill_holes_in_mask_old", fill_mask_legacy, lambda m: fill_holes(m, close_iterations=2)),
+        ("fill_holes(close_iterations=2)", lambda m: fill_holes(m, close_iterations=2), fill_mask_legacy),
+        ("fill_holes_in_mask (semente no centro)", fill_holes_center_legacy, fill_holes),
+        ("fill_holes", fill_holes, fill_holes_center_legacy),
+    ]
+
+    print(f"{'imagem':30} {'método':40} {'ms':>8} {'concordância':>13}")
+    for image_path in args.images:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Erro: não foi possível ler {image_path}")
+            continue
+        mask, _ = segment(image, params)
+
+        for name, func, reference in methods:
+            ms, output = _time(func, mask, args.repeat)
+            agreement = _agreement(output, reference(mask))
+            print(f"{image_path[-30:]:30} {name:40} {ms:8.2f} {agreement:13.4%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
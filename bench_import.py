@@ -0,0 +1,48 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Mede a importação num interpretador novo, informando também se módulos pesados foram carregados
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, int("matplotlib" in sys.modules), len(sys.modules))
+"""
+
+
+def time_import(module, repeat=5, python=sys.executable):
+    """
+    Tempo de importação de um módulo em interpretadores novos (sem cache de módulos).
+
+    :return: (lista de tempos em s, matplotlib carregado?, número de módulos carregados)
+    """
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([python, "-c", PROBE.format(module=module)],
+                                capture_output=True, text=True, check=True).stdout
+        # A última linha é a do probe; qualquer print do próprio módulo vem antes
+        elapsed, matplotlib_loaded, modules = output.strip().splitlines()[-1].split()
+        times.append(float(elapsed))
+    return times, bool(int(matplotlib_loaded)), int(modules)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação dos módulos do SizeIT.")
+    parser.add_argument("modules", nargs="*", default=["sizeitCalibration", "batch", "segmentation"],
+                        help="Módulos a importar")
+    parser.add_argument("--repeat", type=int, default=5, help="Número de interpretadores por módulo")
+    args = parser.parse_args(argv)
+
+    print(f"{'módulo':20} {'mediana (ms)':>13} {'mínimo (ms)':>12} {'matplotlib':>11} {'módulos':>8}")
+    for module in args.modules:
+        times, matplotlib_loaded, modules = time_import(module, args.repeat)
+        print(f"{module:20} {1000 * statistics.median(times):13.1f} {1000 * min(times):12.1f} "
+              f"{'sim' if matplotlib_loaded else 'não':>11} {modules:8d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
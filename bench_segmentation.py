@@ -0,0 +1,101 @@
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+import sizeitCalibration as sc
+from segmentation import BACKENDS, segment_mask
+
+
+def measure(analysis, pixel_to_mm_ratio, positions):
+    """
+    Comprimento e diâmetros (mm) de uma análise, sem log nem anotações.
+
+    :return: (comprimento, {posição: diâmetro}) ou (None, {}) se não houver peça
+    """
+    piece, _ = sc.align_piece(analysis, mode="contour")
+    if piece is None or piece.bounding_rect is None:
+        return None, {}
+    length_mm = piece.length_px / pixel_to_mm_ratio
+    stations = sc.sample_diameters(piece, pixel_to_mm_ratio, positions) or []
+    return length_mm, {round(p, 3): d for p, d in stations}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara tempo e concordância das medições entre os métodos de segmentação.")
+    parser.add_argument("images", nargs="+", help="Imagens das peças")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help=f"Métodos separados por vírgula (disponíveis: {', '.join(BACKENDS)})")
+    parser.add_argument("--stations", type=int, default=10, help="Número de estações de diâmetro")
+    parser.add_argument("--ratio", type=float, default=None, help="Relação pixels/mm (padrão: config.json)")
+    args = parser.parse_args(argv)
+
+    pixel_to_mm_ratio = args.ratio or sc.load_calibration()
+    if not pixel_to_mm_ratio:
+        print("Erro: informe --ratio ou calibre antes (config.json).")
+        return 1
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+
+    # Por método: tempos (s), diferenças de comprimento e de diâmetro (mm) e falhas
+    stats = {name: {"times": [], "length": [], "diameter": [], "failures": 0, "error": None} for name in backends}
+
+    for image_path in args.images:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Erro: não foi possível ler {image_path}")
+            continue
+
+        # Referência: o pipeline atual (Canny + maior contorno direto no PieceAnalysis)
+        reference = sc.PieceAnalysis(image_path=image_path, image=image)
+        piece, _ = sc.align_piece(reference, mode="contour")
+        if piece is None:
+            print(f"{image_path}: referência sem contorno, ignorada")
+            continue
+        ref_length = piece.length_px / pixel_to_mm_ratio
+        step = ref_length / args.stations
+        positions = np.arange(step, ref_length, step)
+        ref_length, ref_diameters = measure(reference, pixel_to_mm_ratio, positions)
+
+        for name in backends:
+            entry = stats[name]
+            if entry["error"]:
+                continue
+            try:
+                start = time.perf_counter()
+                mask = segment_mask(image, name)
+                entry["times"].append(time.perf_counter() - start)
+                length_mm, diameters = measure(sc.MaskAnalysis(mask, image=image, image_path=image_path),
+                                               pixel_to_mm_ratio, positions)
+            except ImportError as exc:  # Dependência opcional ausente (ex.: rembg)
+                entry["error"] = f"indisponível ({exc})"
+                continue
+            except Exception as exc:  # Erro do método nesta imagem: conta como falha e segue
+                print(f"{image_path}: {name} falhou ({type(exc).__name__}: {exc})")
+                entry["failures"] += 1
+                continue
+
+            if length_mm is None:
+                entry["failures"] += 1
+                continue
+            entry["length"].append(abs(length_mm - ref_length))
+            common = [p for p in ref_diameters if p in diameters]
+            if common:
+                entry["diameter"].append(np.mean([abs(diameters[p] - ref_diameters[p]) for p in common]))
+
+    print(f"{'método':12} {'tempo médio (ms)':>17} {'|Δ comprimento| mm':>19} {'|Δ diâmetro| mm':>16} {'falhas':>7}")
+    for name in backends:
+        entry = stats[name]
+        if entry["error"]:
+            print(f"{name:12} {entry['error']}")
+            continue
+        mean_ms = 1000 * np.mean(entry["times"]) if entry["times"] else float("nan")
+        length = np.mean(entry["length"]) if entry["length"] else float("nan")
+        diameter = np.mean(entry["diameter"]) if entry["diameter"] else float("nan")
+        print(f"{name:12} {mean_ms:17.1f} {length:19.3f} {diameter:16.3f} {entry['failures']:7d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import os
+import threading
+from multiprocessing import util
+
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    # Uma thread do processo pai pode ter segurado o lock no instante do fork
+    global _lock
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_lock)
+
+
+class ForkAware:
+    """
+    Base de objetos globais do processo (destino de medições, profiler, destino de
+    imagens) usados também pelos processos filhos do pool do batch.
+
+    Na primeira vez que o objeto é usado em cada processo (_check_process),
+    _start_process é chamado com forked=True se o estado veio do processo pai
+    via fork, para ser descartado, e _at_exit é registrado para o encerramento
+    do processo: util.Finalize roda no atexit do processo principal e na saída
+    dos processos filhos (o multiprocessing limpa os finalizadores herdados).
+
+    :cvar exit_priority: Prioridade do finalizador (maior roda antes)
+    """
+
+    exit_priority = 10
+    _pid = None
+
+    def _check_process(self):
+        """Prepara o objeto para o processo atual, se ainda não foi preparado."""
+        if self._pid == os.getpid():
+            return
+        with _lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            self._start_process(forked=self._pid is not None)
+            util.Finalize(self, self._at_exit, exitpriority=self.exit_priority)
+            # Publicado por último: outras threads só usam o objeto depois de preparado
+            self._pid = pid
+
+    def _start_process(self, forked):
+        """Prepara o estado do processo atual; forked indica estado herdado do pai."""
+
+    def _at_exit(self):
+        """Chamado no encerramento de cada processo que usou o objeto."""
@@ -0,0 +1,142 @@
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Fator de redução padrão da segmentação grosseira e iterações em cada escala
+DEFAULT_SCALE = 0.25
+COARSE_ITERATIONS = 5
+REFINE_ITERATIONS = 2
+
+
+def _is_foreground(mask):
+    return (mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)
+
+
+def _downscale_init_mask(init_mask, size):
+    """
+    Reduz uma máscara inicial do GrabCut sem perder marcações finas (ex.: bordas
+    do Canny marcadas como provável primeiro plano).
+    """
+    small = cv2.resize(init_mask, size, interpolation=cv2.INTER_NEAREST)
+    foreground = cv2.resize(_is_foreground(init_mask).astype(np.uint8) * 255, size,
+                            interpolation=cv2.INTER_AREA) > 0
+    small[foreground & ~_is_foreground(small)] = cv2.GC_PR_FGD
+    return small
+
+
+def grabcut_mask(image, rect=None, init_mask=None, iterations=COARSE_ITERATIONS, scale=DEFAULT_SCALE,
+                 band=None, refine_iterations=REFINE_ITERATIONS):
+    """
+    GrabCut em duas escalas, com o resultado em memória.
+
+    1. Segmentação grosseira numa cópia reduzida da imagem (fator scale).
+    2. A máscara é levada à resolução total; longe do contorno ela é tomada
+       como certa (primeiro plano / fundo definitivos) e só uma faixa estreita
+       em volta do contorno fica em aberto.
+    3. Refinamento em resolução total, apenas no recorte que contém a faixa.
+
+    Com scale >= 1 roda o GrabCut tradicional em resolução total.
+
+    :param image: Imagem BGR
+    :param rect: Retângulo (x, y, w, h) que envolve a peça (GC_INIT_WITH_RECT)
+    :param init_mask: Máscara inicial do GrabCut (GC_INIT_WITH_MASK); usada se rect for None
+    :param iterations: Iterações da segmentação grosseira
+    :param scale: Fator de redução da segmentação grosseira
+    :param band: Meia largura (pixels) da faixa refinada; padrão: 2 pixels da escala reduzida
+    :param refine_iterations: Iterações do refinamento em resolução total
+    :return: Máscara binária uint8 (1 = peça, 0 = fundo)
+    """
+    if rect is None and init_mask is None:
+        raise ValueError("Informe rect ou init_mask.")
+    h, w = image.shape[:2]
+    bgd_model = np.zeros((1, 65), np.float64)
+    fgd_model = np.zeros((1, 65), np.float64)
+
+    if scale >= 1:
+        mask = np.zeros((h, w), np.uint8) if init_mask is None else init_mask.copy()
+        mode = cv2.GC_INIT_WITH_RECT if rect is not None else cv2.GC_INIT_WITH_MASK
+        cv2.grabCut(image, mask, rect, bgd_model, fgd_model, iterations, mode)
+        return _is_foreground(mask).astype(np.uint8)
+
+    # **Passo 1: GrabCut na imagem reduzida**
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if rect is not None:
+        x, y, rw, rh = rect
+        small_rect = (int(x * scale), int(y * scale), max(1, int(rw * scale)), max(1, int(rh * scale)))
+        small_mask = np.zeros(small.shape[:2], np.uint8)
+        cv2.grabCut(small, small_mask, small_rect, bgd_model, fgd_model, iterations, cv2.GC_INIT_WITH_RECT)
+    else:
+        small_mask = _downscale_init_mask(init_mask, size)
+        cv2.grabCut(small, small_mask, None, bgd_model, fgd_model, iterations, cv2.GC_INIT_WITH_MASK)
+
+    # **Passo 2: Máscara em resolução total, com a faixa em volta do contorno em aberto**
+    coarse = cv2.resize(_is_foreground(small_mask).astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST)
+    if not coarse.any():
+        return coarse
+    band = band or int(np.ceil(2 / scale))
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * band + 1, 2 * band + 1))
+    inner = cv2.erode(coarse, kernel)
+    outer = cv2.dilate(coarse, kernel)
+
+    mask = np.full((h, w), cv2.GC_BGD, np.uint8)
+    mask[outer > 0] = cv2.GC_PR_BGD
+    mask[coarse > 0] = cv2.GC_PR_FGD
+    mask[inner > 0] = cv2.GC_FGD
+    if init_mask is not None:
+        # As marcações definitivas do usuário continuam valendo em resolução total
+        mask[init_mask == cv2.GC_BGD] = cv2.GC_BGD
+        mask[init_mask == cv2.GC_FGD] = cv2.GC_FGD
+
+    # **Passo 3: Refinamento só no recorte que contém a faixa (mais uma margem para os modelos de cor)**
+    band_pixels = (outer > 0) & (inner == 0)
+    if refine_iterations and band_pixels.any():
+        bx, by, bw, bh = cv2.boundingRect(band_pixels.astype(np.uint8))
+        margin = 2 * band
+        x0, y0 = max(bx - margin, 0), max(by - margin, 0)
+        x1, y1 = min(bx + bw + margin, w), min(by + bh + margin, h)
+        crop_mask = mask[y0:y1, x0:x1].copy()
+        # O GrabCut exige amostras de fundo e de primeiro plano no recorte
+        if _is_foreground(crop_mask).any() and not _is_foreground(crop_mask).all():
+            cv2.grabCut(np.ascontiguousarray(image[y0:y1, x0:x1]), crop_mask, None,
+                        bgd_model, fgd_model, refine_iterations, cv2.GC_INIT_WITH_MASK)
+            mask[y0:y1, x0:x1] = crop_mask
+
+    return _is_foreground(mask).astype(np.uint8)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara o GrabCut em resolução total com o GrabCut multiescala.")
+    parser.add_argument("images", nargs="+", help="Imagens das peças")
+    parser.add_argument("--scale", type=float, default=DEFAULT_SCALE, help="Fator de redução da etapa grosseira")
+    parser.add_argument("--margin", type=int, default=10, help="Margem (pixels) do retângulo inicial")
+    args = parser.parse_args(argv)
+
+    for image_path in args.images:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Erro: não foi possível ler {image_path}")
+            continue
+        h, w = image.shape[:2]
+        rect = (args.margin, args.margin, w - 2 * args.margin, h - 2 * args.margin)
+
+        start = time.perf_counter()
+        full = grabcut_mask(image, rect=rect, scale=1.0)
+        full_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = grabcut_mask(image, rect=rect, scale=args.scale)
+        fast_s = time.perf_counter() - start
+
+        union = np.count_nonzero(full | fast)
+        iou = np.count_nonzero(full & fast) / union if union else 1.0
+        print(f"{image_path}: resolução total {full_s:.2f}s, multiescala {fast_s:.2f}s "
+              f"({full_s / fast_s:.1f}x), IoU {iou:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
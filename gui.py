@@ -4,7 +4,55 @@ import cv2
 from PIL import Image, ImageTk
 import sizeitCalibration as sc
 import os
+import queue
+import threading
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Intervalo (ms) de leitura dos eventos do processamento em segundo plano
+POLL_INTERVAL_MS = 100
+
+# Pré-visualização: maior lado da cópia reduzida em cache, quantas imagens manter
+# e quanto tempo (ms) sem redimensionar antes do LANCZOS final
+PREVIEW_MAX_SIDE = 1600
+PREVIEW_CACHE_SIZE = 8
+PREVIEW_SETTLE_MS = 200
+DEFAULT_DISPLAY_SIZE = (600, 450)
+
+
+class JobCancelled(Exception):
+    """Interrompe uma tarefa em segundo plano cancelada pelo usuário."""
+
+
+class Job:
+    """
+    Tarefa em segundo plano. A função recebe o próprio Job para informar o
+    progresso (job.progress) e verificar o cancelamento (job.check_cancelled)
+    entre as etapas; a etapa OpenCV em andamento não é interrompida, mas o
+    resultado de uma tarefa cancelada é descartado.
+    """
+
+    def __init__(self, job_id, name, events):
+        self.job_id = job_id
+        self.name = name
+        self._events = events
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def progress(self, message):
+        self._events.put(("progress", self.job_id, message))
+
 
 class SizeITApp:
     def __init__(self, root):
@@ -15,8 +63,23 @@ class SizeITApp:
         
         self.image_calib_path = None
         self.image_piece_path = None
+        self.piece = None  # Análise em memória da peça (alinhada ou não)
         self.pixel_to_mm_ratio = None
         
+        # Processamento OpenCV fora do loop do Tk: um trabalhador, eventos via fila
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.current_job = None
+        self._job_counter = 0
+        self._job_callbacks = {}
+        
+        # Cache das pré-visualizações reduzidas (chave -> imagem PIL) e imagem exibida
+        self._preview_cache = OrderedDict()
+        self._preview_counter = 0  # Chaves únicas para arrays sem chave própria
+        self._display_key = None
+        self._settle_id = None
+        self._panel_size = None
+        
         # Criar frame esquerdo (barra de botões) ocupando a altura total
         self.frame_left = Frame(root, width=80, bg="#34495e")
         self.frame_left.pack(side=tk.LEFT, fill=tk.Y)
@@ -68,12 +131,20 @@ class SizeITApp:
         self.btn_measure.pack(pady=10)
         self._create_tooltip(self.btn_measure, "Medir peça")
         
+        self.btn_cancel = ttk.Button(self.frame_left, text="Cancelar", command=self.cancel_job)
+        self.btn_cancel.pack(pady=10)
+        self.btn_cancel.state(["disabled"])
+        self._create_tooltip(self.btn_cancel, "Cancelar o processamento em andamento")
+        
         # Área de exibição de resultados e imagem (painel superior)
         self.label_result = Label(self.frame_top, text="Resultados aparecerão aqui", font=("Arial", 12), bg="#ecf0f1")
         self.label_result.pack(pady=10)
         
         self.label_image = Label(self.frame_top, bg="#ecf0f1")
-        self.label_image.pack()
+        self.label_image.pack(fill=tk.BOTH, expand=True)
+        
+        # Reescalar a imagem exibida quando o painel muda de tamanho
+        self.frame_top.bind("<Configure>", self._on_display_resize)
         
         # Criar tabela para exibir os resultados (painel inferior)
         self.tree = ttk.Treeview(self.frame_bottom, columns=("Medição", "Valor (mm)"), show="headings")
@@ -82,25 +153,99 @@ class SizeITApp:
         self.tree.column("Medição", width=200)
         self.tree.column("Valor (mm)", width=150)
         self.tree.pack(pady=10, fill=tk.BOTH, expand=True)
+        
+        self.root.after(POLL_INTERVAL_MS, self._poll_events)
     
     def adjust_table_rows(self, event):
         row_height = 20  # Altura aproximada de uma linha na Treeview
         num_rows = max(1, event.height // row_height)  # Calcular quantas linhas cabem
         self.tree.configure(height=num_rows)
 
-    def display_image(self, img_path):
-        if not os.path.exists(img_path):
-            self.label_result.config(text="Erro ao carregar a imagem!")
+    def display_image(self, source, key=None):
+        """
+        Exibe uma imagem a partir de um caminho ou de um array BGR vindo do pipeline.
+
+        A imagem é reduzida uma única vez (PREVIEW_MAX_SIDE) e mantida em cache;
+        a exibição usa uma interpolação barata e o LANCZOS só é aplicado quando
+        o tamanho do painel se estabiliza.
+
+        :param source: Caminho da imagem ou array BGR
+        :param key: Chave do cache para arrays, única por conteúdo (ex.: com o número do job);
+                    caminhos usam o próprio caminho e a data de modificação
+        """
+        if isinstance(source, np.ndarray):
+            if key is None:
+                # Não usar id(): o id de um array já liberado pode ser reaproveitado
+                self._preview_counter += 1
+                key = ("array", self._preview_counter)
+        else:
+            if not source or not os.path.exists(source):
+                self.label_result.config(text="Erro ao carregar a imagem!")
+                return
+            key = (source, os.path.getmtime(source))
+        
+        if key in self._preview_cache:
+            self._preview_cache.move_to_end(key)
+        else:
+            image = cv2.imread(source) if not isinstance(source, np.ndarray) else source
+            if image is None:
+                self.label_result.config(text="Erro ao carregar a imagem!")
+                return
+            self._preview_cache[key] = self._make_preview(image)
+            while len(self._preview_cache) > PREVIEW_CACHE_SIZE:
+                self._preview_cache.popitem(last=False)
+        
+        self._display_key = key
+        self._render_preview(Image.LANCZOS)
+    
+    def _make_preview(self, image):
+        """Cópia reduzida em RGB (INTER_AREA) usada em todas as exibições seguintes."""
+        h, w = image.shape[:2]
+        scale = min(1.0, PREVIEW_MAX_SIDE / max(h, w))
+        if scale < 1.0:
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(image)
+    
+    def _display_size(self):
+        # Área do painel superior abaixo do texto de resultado (antes do primeiro desenho: tamanho padrão)
+        width = self.frame_top.winfo_width()
+        height = self.frame_top.winfo_height() - self.label_result.winfo_height() - 20
+        if width <= 1 or height <= 1:
+            return DEFAULT_DISPLAY_SIZE
+        return width, height
+    
+    def _render_preview(self, resample):
+        preview = self._preview_cache.get(self._display_key)
+        if preview is None:
             return
         
-        image = cv2.imread(img_path)
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image = Image.fromarray(image)
-        image = image.resize((600, 450), Image.LANCZOS)
-        img_tk = ImageTk.PhotoImage(image)
+        # Manter a proporção dentro da área disponível
+        width, height = self._display_size()
+        scale = min(width / preview.width, height / preview.height)
+        size = (max(1, int(preview.width * scale)), max(1, int(preview.height * scale)))
+        
+        img_tk = ImageTk.PhotoImage(preview.resize(size, resample))
         self.label_image.config(image=img_tk)
         self.label_image.image = img_tk
     
+    def _on_display_resize(self, event):
+        if self._display_key is None or (event.width, event.height) == self._panel_size:
+            return
+        self._panel_size = (event.width, event.height)
+        # Reescala rápida durante o arraste; LANCZOS quando o painel parar de mudar
+        self._render_preview(Image.BILINEAR)
+        if self._settle_id is not None:
+            self.root.after_cancel(self._settle_id)
+        self._settle_id = self.root.after(PREVIEW_SETTLE_MS, self._on_display_settled)
+    
+    def _on_display_settled(self):
+        self._settle_id = None
+        self._render_preview(Image.LANCZOS)
+    
     def _resize_icon(self, path, width, height):
         if os.path.exists(path):
             img = Image.open(path)
@@ -139,57 +284,169 @@ class SizeITApp:
     def load_piece_image(self):
         self.image_piece_path = filedialog.askopenfilename(filetypes=[("Imagens", "*.png;*.jpg;*.jpeg")])
         if self.image_piece_path:
+            self.piece = None
             self.label_result.config(text=f"Imagem da peça carregada: {os.path.basename(self.image_piece_path)}")
             self.display_image(self.image_piece_path)
     
+    def _start_job(self, name, func, on_done, *args):
+        """
+        Executa func(job, *args) no trabalhador em segundo plano e chama
+        on_done(resultado) no loop do Tk quando terminar.
+        """
+        if self.current_job is not None:
+            self.label_result.config(text=f"Aguarde: {self.current_job.name} em andamento...")
+            return
+        
+        self._job_counter += 1
+        job = Job(self._job_counter, name, self.events)
+        self.current_job = job
+        self._job_callbacks[job.job_id] = on_done
+        self._set_busy(True)
+        self.label_result.config(text=f"{name}...")
+        
+        def run():
+            try:
+                job.check_cancelled()
+                result = func(job, *args)
+                self.events.put(("done", job.job_id, result))
+            except JobCancelled:
+                self.events.put(("cancelled", job.job_id, None))
+            except Exception as exc:
+                self.events.put(("error", job.job_id, exc))
+        
+        self.executor.submit(run)
+    
+    def cancel_job(self):
+        if self.current_job is None:
+            return
+        # O resultado da tarefa cancelada será descartado; a próxima pode ser iniciada já
+        self.current_job.cancel()
+        self.label_result.config(text=f"{self.current_job.name} cancelado.")
+        self.current_job = None
+        self._set_busy(False)
+    
+    def _set_busy(self, busy):
+        for button in (self.btn_calibrate, self.btn_align, self.btn_measure):
+            button.state(["disabled"] if busy else ["!disabled"])
+        self.btn_cancel.state(["!disabled"] if busy else ["disabled"])
+    
+    def _poll_events(self):
+        """Aplica na interface os eventos enviados pelo trabalhador (sempre no loop do Tk)."""
+        try:
+            while True:
+                kind, job_id, payload = self.events.get_nowait()
+                on_done = self._job_callbacks.pop(job_id, None) if kind != "progress" else None
+                is_current = self.current_job is not None and self.current_job.job_id == job_id
+                if not is_current:
+                    continue  # Tarefa cancelada: descartar
+                
+                if kind == "progress":
+                    self.label_result.config(text=payload)
+                    continue
+                
+                self.current_job = None
+                self._set_busy(False)
+                if kind == "done":
+                    try:
+                        on_done(payload)
+                    except Exception as exc:
+                        # Um erro ao aplicar o resultado não pode parar o processamento dos eventos
+                        self.label_result.config(text=f"Erro: {exc}")
+                elif kind == "error":
+                    self.label_result.config(text=f"Erro: {payload}")
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(POLL_INTERVAL_MS, self._poll_events)
+    
     def run_calibration(self):
         if not self.image_calib_path:
             self.label_result.config(text="Selecione uma imagem de calibração!")
             return
-        self.pixel_to_mm_ratio = sc.calibrate(self.image_calib_path)
-        if self.pixel_to_mm_ratio:
-            self.label_result.config(text=f"Calibração realizada: {self.pixel_to_mm_ratio:.3f} pixels/mm")
-        else:
-            self.label_result.config(text="Falha na calibração!")
+        
+        def work(job, image_path):
+            job.progress("Detectando o círculo de referência...")
+            # O cache evita refazer o HoughCircles para a mesma imagem e parâmetros
+            return sc.calibrate_cached(image_path)
+        
+        def done(pixel_to_mm_ratio):
+            self.pixel_to_mm_ratio = pixel_to_mm_ratio
+            if self.pixel_to_mm_ratio:
+                self.label_result.config(text=f"Calibração realizada: {self.pixel_to_mm_ratio:.3f} pixels/mm")
+            else:
+                self.label_result.config(text="Falha na calibração!")
+        
+        self._start_job("Calibração", work, done, self.image_calib_path)
     
     def align_piece(self):
         if not self.image_piece_path:
             self.label_result.config(text="Selecione uma imagem da peça!")
             return
-        aligned_path = sc.align_image(self.image_piece_path)
-        if aligned_path and os.path.exists(aligned_path):
-            self.display_image(aligned_path)
-            self.image_piece_path = aligned_path
-            self.label_result.config(text="Imagem alinhada com sucesso!")
-        else:
-            self.label_result.config(text="Falha no alinhamento!")
+        
+        def work(job, image_path):
+            job.progress("Alinhando a peça...")
+            # A imagem alinhada fica só em memória: é exibida e medida sem passar pelo disco
+            aligned, _ = sc.align_piece(image_path)
+            return image_path, aligned, job.job_id
+        
+        def done(result):
+            image_path, aligned, job_id = result
+            if image_path != self.image_piece_path:
+                return  # Outra imagem foi carregada enquanto alinhava
+            if aligned is not None:
+                self.piece = aligned
+                self.display_image(aligned.image, key=(image_path, "_ALIGN", job_id))
+                self.label_result.config(text="Imagem alinhada com sucesso!")
+            else:
+                self.label_result.config(text="Falha no alinhamento!")
+        
+        self._start_job("Alinhamento", work, done, self.image_piece_path)
     
     def measure_piece(self):
         if not self.image_piece_path or not self.pixel_to_mm_ratio:
             self.label_result.config(text="Calibre e selecione uma imagem primeiro!")
             return
-        length_mm = sc.get_piece_length(self.image_piece_path, self.pixel_to_mm_ratio)
-                
-        # definindo nro medidas
-        nro_medidas = 10
-        passo = length_mm/nro_medidas
-        measure_positions = np.arange(passo, length_mm + passo, passo)
         
-        diameters, output_path = sc.measure_diameters(self.image_piece_path, self.pixel_to_mm_ratio, measure_positions)
+        def work(job, image_path, piece, pixel_to_mm_ratio):
+            # Análise única compartilhada entre comprimento e diâmetros
+            piece = piece or sc.PieceAnalysis(image_path=image_path)
+            job.progress("Medindo o comprimento...")
+            length_mm = sc.get_piece_length(piece, pixel_to_mm_ratio)
+            if not length_mm:
+                raise ValueError("nenhum contorno detectado")
+            job.check_cancelled()
+            
+            # definindo nro medidas
+            nro_medidas = 10
+            passo = length_mm/nro_medidas
+            measure_positions = np.arange(passo, length_mm + passo, passo)
+            
+            job.progress("Medindo os diâmetros...")
+            # Uma única consulta ao perfil: log, anotação e (posição, diâmetro) para a tabela
+            stations, _ = sc.measure_diameters(piece, pixel_to_mm_ratio, measure_positions, return_positions=True)
+            return image_path, length_mm, stations, piece.annotations["_M"], job.job_id
         
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-                
-        self.tree.insert("", "end", values=("Comprimento", f"{length_mm:.2f}"))
-        for i, diameter in enumerate(diameters):
-            self.tree.insert("", "end", values=(f"Diâmetro {measure_positions[i]}mm", f"{diameter:.2f}"))
+        def done(result):
+            image_path, length_mm, stations, annotated, job_id = result
+            
+            for item in self.tree.get_children():
+                self.tree.delete(item)
+            
+            self.tree.insert("", "end", values=("Comprimento", f"{length_mm:.2f}"))
+            for position, diameter in stations:
+                self.tree.insert("", "end", values=(f"Diâmetro {position:.2f}mm", f"{diameter:.2f}"))
+            
+            self.label_result.config(text=f"Medição concluída: {os.path.basename(image_path)}")
+            # colocando a imagem resultante da medida (se outra peça não foi carregada nesse meio tempo)
+            if image_path == self.image_piece_path:
+                self.display_image(annotated, key=(image_path, "_M", job_id))
         
-        # colocando a imagem resultante da medida
-        self.display_image(output_path)
+        self._start_job("Medição", work, done, self.image_piece_path, self.piece, self.pixel_to_mm_ratio)
     
     
 if __name__ == "__main__":
     root = tk.Tk()
     app = SizeITApp(root)
     root.mainloop()
+    app.executor.shutdown(wait=False, cancel_futures=True)
 
@@ -1,33 +1,65 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
 import os
+from artifacts import get_sink
+from metrics import stage
+from sizeitCalibration import column_extents
+
+def column_widths(mask, num_samples=None):
+    """
+    Primeira/última linha da peça e largura em cada coluna da máscara.
+
+    Os extremos de todas as colunas saem de uma única redução (argmax na
+    máscara e na cópia invertida, ver sizeitCalibration.column_extents); as
+    colunas amostradas são apenas indexadas nesse resultado.
+
+    :param mask: Máscara binária (peça = 255)
+    :param num_samples: Número de colunas igualmente espaçadas entre a primeira e a
+                        última coluna com peça; None devolve todas as colunas com peça
+    :return: Lista de (x, y_min, y_max, largura) das colunas com peça
+    """
+    foreground = mask == 255
+    top, bottom, _ = column_extents(foreground)
+    # A primeira linha "encontrada" só é peça se a coluna tiver algum pixel
+    present = foreground[top, np.arange(foreground.shape[1])]
+    
+    columns = np.flatnonzero(present)
+    if num_samples is not None and columns.size:
+        columns = np.linspace(columns[0], columns[-1], num_samples).astype(int)
+        columns = columns[present[columns]]
+    return [(int(x), int(top[x]), int(bottom[x]), int(bottom[x] - top[x])) for x in columns]
 
 def process_image(image_path, num_samples=20):
     # Carregar a imagem
-    image = cv2.imread(image_path)
+    with stage("imread") as timer:
+        image = timer.image = cv2.imread(image_path)
     
     # Obter diretório e nome do arquivo
     directory, filename = os.path.split(image_path)
     base_name, _ = os.path.splitext(filename)
     
     # Converter para escala de cinza
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    with stage("gray", image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Aplicar desfoque para reduzir ruído
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    with stage("blur", gray):
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     
     # Aplicar limiarização adaptativa
-    thresh = cv2.adaptiveThreshold(
-        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
-    )
+    with stage("adaptive_threshold", blurred):
+        thresh = cv2.adaptiveThreshold(
+            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
+        )
     
     # Detectar bordas usando Canny
-    edges = cv2.Canny(thresh, 50, 150)
+    with stage("canny", thresh):
+        edges = cv2.Canny(thresh, 50, 150)
     
     # Encontrar contornos na imagem binária
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    with stage("find_contours", edges):
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     # Criar uma máscara preta do mesmo tamanho da imagem
     mask = np.zeros_like(gray)
@@ -35,36 +67,26 @@ def process_image(image_path, num_samples=20):
     # Desenhar os contornos na máscara
     cv2.drawContours(mask, contours, -1, (255), thickness=cv2.FILLED)
     
-    # Obter as coordenadas da máscara onde a peça está presente
-    y_indices, x_indices = np.where(mask == 255)
-    
-    # Criar uma grade de pontos para medições transversais
-    x_min, x_max = np.min(x_indices), np.max(x_indices)
-    x_samples = np.linspace(x_min, x_max, num_samples).astype(int)
-    
-    # Armazenar as medidas de largura
-    width_measurements = []
-    
-    for x in x_samples:
-        y_values = y_indices[x_indices == x]  # Pegar todas as alturas (y) nessa coluna x
-        if len(y_values) > 0:
-            y_min, y_max = np.min(y_values), np.max(y_values)
-            width_measurements.append((x, y_min, y_max, y_max - y_min))
+    # Perfil de larguras numa grade de colunas para medições transversais (num_samples=None mantém todas)
+    with stage("column_widths", mask):
+        width_measurements = column_widths(mask, num_samples)
     
     # Converter os dados em um DataFrame
     df_measurements = pd.DataFrame(width_measurements, columns=["X", "Y_Min", "Y_Max", "Width"])
     
-    # Salvar imagens intermediárias
-    cv2.imwrite(os.path.join(directory, f"{base_name}_gray.jpg"), gray)
-    cv2.imwrite(os.path.join(directory, f"{base_name}_thresh.jpg"), thresh)
-    cv2.imwrite(os.path.join(directory, f"{base_name}_edges.jpg"), edges)
-    cv2.imwrite(os.path.join(directory, f"{base_name}_mask.jpg"), mask)
-    
-    # Criar uma cópia da máscara para desenhar medições
-    mask_with_lines = mask.copy()
-    for x, y_min, y_max, width in width_measurements:
-        cv2.line(mask_with_lines, (x, y_min), (x, y_max), (255, 0, 0), 1)
-    cv2.imwrite(os.path.join(directory, f"{base_name}_measurements.jpg"), mask_with_lines)
+    # Salvar imagens intermediárias em segundo plano (nível off/sampled/all do artifacts)
+    sink = get_sink()
+    if sink.wants(image_path):
+        # Nenhum destes arrays é alterado depois, então não precisam ser copiados
+        for suffix, stage_image in (("gray", gray), ("thresh", thresh), ("edges", edges), ("mask", mask)):
+            sink.save(os.path.join(directory, f"{base_name}_{suffix}.jpg"), stage_image, source=image_path, copy=False)
+        
+        # Criar uma cópia da máscara para desenhar medições
+        mask_with_lines = mask.copy()
+        for x, y_min, y_max, width in width_measurements:
+            cv2.line(mask_with_lines, (x, y_min), (x, y_max), (255, 0, 0), 1)
+        sink.save(os.path.join(directory, f"{base_name}_measurements.jpg"), mask_with_lines,
+                  source=image_path, copy=False)
     
     return df_measurements
 
@@ -96,6 +118,7 @@ file_list = [
 # por enquanto eh a melhor opcao de arrancar o fundo e criar mascadas, mas ainda nao mede nada direito . . .
 #
 # 
-for  name in file_list:
-    df_results = process_image(name)
-    print (df_results)
+if __name__ == "__main__":
+    for  name in file_list:
+        df_results = process_image(name)
+        print (df_results)
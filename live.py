@@ -0,0 +1,355 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import sizeitCalibration as sc
+from batchutil import collect_images
+from measurement_log import open_store
+from metrics import get_profiler, open_profiler, set_profiler, stage
+
+# Tamanho padrão da fila de quadros: poucos quadros, para medir sempre o mais recente
+FRAME_QUEUE_SIZE = 2
+
+
+class FolderSource:
+    """
+    Reproduz uma pasta (ou padrão glob) de imagens como se fosse uma câmera,
+    com a mesma interface de leitura do cv2.VideoCapture (read/isOpened/release).
+
+    :param inputs: Diretório, arquivo ou padrão glob (ou lista deles)
+    :param fps: Quadros por segundo simulados (como uma câmera: quadros atrasados são
+                descartados); None entrega todos os quadros, o mais rápido possível
+    :param loop: Se True, recomeça do início ao chegar na última imagem
+    :param preload: Se True, decodifica todas as imagens antes de começar, para que a
+                    leitura de disco não limite a cadência (como numa câmera real)
+    """
+
+    def __init__(self, inputs, fps=None, loop=False, preload=False):
+        self.paths = collect_images([inputs] if isinstance(inputs, str) else inputs)
+        self.fps = fps
+        self.loop = loop
+        # Só a reprodução cadenciada se comporta como câmera (descarta quadros atrasados)
+        self.live = fps is not None
+        self._frames = [cv2.imread(path) for path in self.paths] if preload else None
+        self._index = 0
+        self._pacer = _Pacer(fps)
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self._index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self._index = 0
+
+        self._pacer.wait()
+        if self._frames is not None:
+            frame = self._frames[self._index]
+        else:
+            with stage("imread") as timer:
+                frame = timer.image = cv2.imread(self.paths[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+    def release(self):
+        self._index = len(self.paths)
+
+
+class _Pacer:
+    """Espera entre leituras para respeitar uma cadência (fps); fps None não espera."""
+
+    def __init__(self, fps=None):
+        self.fps = fps
+        self._next_time = time.monotonic()
+
+    def wait(self):
+        if not self.fps:
+            return
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time, time.monotonic()) + 1.0 / self.fps
+
+
+class VideoFileSource:
+    """
+    Arquivo de vídeo com a interface do cv2.VideoCapture.
+
+    Por padrão todos os quadros são entregues, sem descarte (reprodução offline).
+    Com realtime=True o vídeo é reproduzido na cadência gravada (CAP_PROP_FPS,
+    ou fps) e se comporta como uma câmera: quadros atrasados são descartados.
+
+    :param path: Caminho do vídeo
+    :param fps: Cadência da reprodução em tempo real (padrão: a do arquivo)
+    :param realtime: Reproduzir na cadência do vídeo, descartando quadros atrasados
+    """
+
+    def __init__(self, path, fps=None, realtime=False):
+        self.capture = cv2.VideoCapture(path)
+        self.live = realtime
+        self._pacer = _Pacer((fps or self.capture.get(cv2.CAP_PROP_FPS) or None) if realtime else None)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        self._pacer.wait()
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+def open_source(spec, fps=None, loop=False, preload=False, realtime=False):
+    """
+    Abre a fonte de quadros.
+
+    Câmeras e URLs são fontes ao vivo (o quadro mais antigo é descartado se a
+    medição atrasar). Arquivos de vídeo e pastas de imagens entregam todos os
+    quadros, salvo em reprodução cadenciada (realtime / fps).
+
+    :param spec: Índice da câmera ('0'), URL/arquivo de vídeo, ou diretório/padrão glob de imagens
+    :param fps: Cadência simulada da reprodução de pastas de imagens (ou do vídeo, com realtime)
+    :param loop: Repetir a pasta de imagens indefinidamente
+    :param preload: Decodificar a pasta de imagens antes de começar
+    :param realtime: Reproduzir o arquivo de vídeo na cadência gravada
+    :return: Objeto com read()/isOpened()/release() (cv2.VideoCapture, VideoFileSource ou FolderSource)
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    if os.path.isdir(spec) or any(ch in spec for ch in "*?["):
+        return FolderSource(spec, fps=fps, loop=loop, preload=preload)
+    if os.path.splitext(spec)[1].lower() in (".png", ".jpg", ".jpeg"):
+        return FolderSource(spec, fps=fps, loop=loop, preload=preload)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, fps=fps, realtime=realtime)
+    return cv2.VideoCapture(spec)
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Lê os quadros da fonte em uma thread própria e os coloca em uma fila limitada.
+
+    Quando a medição não acompanha a câmera, o quadro mais antigo é descartado
+    para que o consumidor sempre receba o quadro mais recente. Com drop=False
+    (reprodução offline) a leitura espera a fila e nenhum quadro é perdido.
+
+    Itens da fila: (número do quadro, instante da captura em time.monotonic(), imagem BGR);
+    None sinaliza o fim da fonte.
+    """
+
+    def __init__(self, source, queue_size=FRAME_QUEUE_SIZE, drop=True):
+        super().__init__(daemon=True)
+        self.source = source
+        self.drop = drop
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.captured = 0
+        self.dropped = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _put_latest(self, item):
+        if not self.drop:
+            self._put_waiting(item)
+            return
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _put_waiting(self, item):
+        # Espera espaço na fila; depois de stop() o consumidor não lê mais a fila,
+        # então nem o marcador de fim (None) precisa ser entregue
+        while True:
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop_event.is_set():
+                    return
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                ok, frame = self.source.read()
+                if not ok:
+                    break
+                self._put_latest((self.captured, time.monotonic(), frame))
+                self.captured += 1
+        finally:
+            self._put_latest(None)
+
+
+def measure_frame(frame, pixel_to_mm_ratio, num_stations=10, mode="contour", subpixel=False, tracker=None,
+                  image_name=None):
+    """
+    Mede uma peça a partir de um quadro em memória (ver sizeitCalibration.measure_piece).
+
+    :param tracker: RoiTracker opcional; restringe o processamento à região da peça
+    :param image_name: Nome do quadro no log (ex.: 'camera#12')
+    :return: (comprimento em mm, lista de (posição, diâmetro) em mm) ou (None, []) se não houver peça
+    """
+    source = tracker.analyze(frame) if tracker else sc.PieceAnalysis(image=frame)
+    if source is None:
+        return None, []
+    source.image_path = image_name
+    result = sc.measure_piece(source, pixel_to_mm_ratio, num_stations, mode, subpixel)
+    return result["length_mm"], result["diameters"]
+
+
+def run_live(source, pixel_to_mm_ratio, num_stations=10, mode="contour", subpixel=False,
+             queue_size=FRAME_QUEUE_SIZE, max_frames=None, on_result=None, source_name="live", roi=False):
+    """
+    Mede continuamente os quadros da fonte até ela terminar (ou max_frames).
+
+    Cada resultado é um dicionário com o número do quadro, comprimento,
+    diâmetros, latência (da captura ao fim da medição) e tempo de processamento, em ms.
+    Um erro ao medir um quadro é registrado no resultado ('error') e a sessão continua.
+
+    :param on_result: Função chamada com cada resultado (padrão: imprime no console)
+    :param roi: Se True, acompanha a peça entre quadros e processa só a região dela (RoiTracker)
+    :return: Lista de resultados
+    """
+    on_result = on_result or print_result
+    tracker = sc.RoiTracker() if roi else None
+    # Fontes offline (vídeo/pasta sem cadência) entregam todos os quadros
+    grabber = FrameGrabber(source, queue_size, drop=getattr(source, "live", True))
+    grabber.start()
+    results = []
+    try:
+        while max_frames is None or len(results) < max_frames:
+            item = grabber.frames.get()
+            if item is None:
+                break
+            frame_id, captured_at, frame = item
+
+            image_name = f"{source_name}#{frame_id}"
+            started = time.monotonic()
+            error = None
+            try:
+                length_mm, diameters = measure_frame(frame, pixel_to_mm_ratio, num_stations, mode, subpixel,
+                                                     tracker, image_name)
+            except Exception as exc:
+                # Um quadro ruim não encerra a sessão
+                length_mm, diameters, error = None, [], f"{type(exc).__name__}: {exc}"
+                print(f"Erro ao medir o quadro {frame_id}: {error}")
+                if tracker:
+                    tracker.reset()
+            finished = time.monotonic()
+
+            result = {"frame": frame_id, "length_mm": length_mm, "diameters": diameters,
+                      "latency_ms": (finished - captured_at) * 1000.0,
+                      "processing_ms": (finished - started) * 1000.0,
+                      "dropped": grabber.dropped, "error": error}
+            results.append(result)
+            on_result(result)
+    finally:
+        # Esperar a leitura em andamento antes de liberar a fonte
+        grabber.stop()
+        grabber.join(timeout=5.0)
+        source.release()
+        sc.flush_measurements()
+    return results
+
+
+def print_result(result):
+    if result.get("error"):
+        status = "erro na medição"
+    elif result["length_mm"] is None:
+        status = "sem peça"
+    else:
+        status = f"{result['length_mm']:.3f}mm, {len(result['diameters'])} diâmetros"
+    print(f"[quadro {result['frame']}] {status} | latência {result['latency_ms']:.1f}ms "
+          f"(processamento {result['processing_ms']:.1f}ms), descartados {result['dropped']}")
+
+
+def summarize(results):
+    """Estatísticas de latência e vazão (ms / quadros por segundo) de uma sessão."""
+    if not results:
+        return {}
+    latency = np.array([r["latency_ms"] for r in results])
+    processing = np.array([r["processing_ms"] for r in results])
+    return {"frames": len(results),
+            "measured": sum(1 for r in results if r["length_mm"]),
+            "errors": sum(1 for r in results if r.get("error")),
+            "dropped": results[-1]["dropped"],
+            "latency_ms_mean": float(latency.mean()),
+            "latency_ms_p95": float(np.percentile(latency, 95)),
+            "processing_ms_mean": float(processing.mean()),
+            "throughput_fps": 1000.0 / float(processing.mean()) if processing.mean() > 0 else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Medição contínua a partir de câmera, vídeo ou pasta de imagens.")
+    parser.add_argument("source", help="Índice da câmera (ex.: 0), arquivo/URL de vídeo ou pasta/padrão de imagens")
+    parser.add_argument("--calib", help="Imagem de calibração (padrão: relação salva em config.json)")
+    parser.add_argument("--profile", default="default", help="Perfil de câmera/lente no cache de calibração")
+    parser.add_argument("--stations", type=int, default=10, help="Número de estações de diâmetro por peça")
+    parser.add_argument("--mode", choices=("contour", "warp"), default="contour", help="Modo de alinhamento")
+    parser.add_argument("--subpixel", action="store_true", help="Refinar as bordas em nível sub-pixel")
+    parser.add_argument("--roi", action="store_true", help="Processar apenas a região da peça, acompanhada entre quadros")
+    parser.add_argument("--queue", type=int, default=FRAME_QUEUE_SIZE, help="Tamanho da fila de quadros")
+    parser.add_argument("--fps", type=float, default=None, help="Cadência simulada ao reproduzir uma pasta de imagens")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Reproduzir o arquivo de vídeo na cadência gravada, descartando quadros como uma câmera")
+    parser.add_argument("--loop", action="store_true", help="Repetir a pasta de imagens indefinidamente")
+    parser.add_argument("--preload", action="store_true", help="Decodificar a pasta de imagens antes de começar")
+    parser.add_argument("--max-frames", type=int, default=None, help="Parar após medir este número de quadros")
+    parser.add_argument("--store", help="Destino do histórico: 'csv[:arquivo]' ou 'sqlite[:arquivo.db]'")
+    parser.add_argument("--metrics", help="Exporta os tempos por etapa ao final ('.json' ou '.prom' do Prometheus)")
+    parser.add_argument("--metrics-memory", action="store_true", help="Mede também o pico de memória por etapa (mais lento)")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        sc.set_measurement_store(open_store(args.store))
+
+    if args.metrics:
+        set_profiler(open_profiler("memory" if args.metrics_memory else "time", args.metrics))
+
+    if args.calib:
+        pixel_to_mm_ratio = sc.calibrate_cached(args.calib, profile=args.profile)
+    else:
+        pixel_to_mm_ratio = sc.load_calibration()
+    if not pixel_to_mm_ratio:
+        print("Erro: Falha na calibração. Verifique a imagem de referência ou o config.json.")
+        return 1
+
+    source = open_source(args.source, fps=args.fps, loop=args.loop, preload=args.preload, realtime=args.realtime)
+    if not source.isOpened():
+        print(f"Erro: não foi possível abrir a fonte {args.source}")
+        return 1
+
+    try:
+        results = run_live(source, pixel_to_mm_ratio, args.stations, args.mode, args.subpixel,
+                           args.queue, args.max_frames, source_name=args.source, roi=args.roi)
+    except KeyboardInterrupt:
+        return 0
+
+    stats = summarize(results)
+    if stats:
+        print(f"{stats['frames']} quadros ({stats['measured']} medidos, {stats['dropped']} descartados, "
+              f"{stats['errors']} com erro) | "
+              f"latência média {stats['latency_ms_mean']:.1f}ms, p95 {stats['latency_ms_p95']:.1f}ms | "
+              f"{stats['throughput_fps']:.1f} quadros/s")
+    if args.metrics:
+        print(get_profiler().report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+import abc
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from forkaware import ForkAware
+
+# Arquivo de log com uma linha por valor medido (colunas numéricas)
+LOG_FILE = "SizeIT_measurements.csv"
+LOG_HEADER = ["Timestamp", "Imagem", "Tipo", "Indice", "Valor"]
+DB_FILE = "SizeIT_measurements.db"
+LEGACY_LOG_FILE = "SizeIT_log.csv"
+
+
+@contextmanager
+def _file_lock(path):
+    """
+    Trava exclusiva entre processos, feita sobre um arquivo '<path>.lock'.
+
+    Usa msvcrt no Windows e fcntl nos demais sistemas.
+    """
+    with open(path + ".lock", "a+") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def extract_lot(image_name):
+    """
+    Número do lote a partir do nome da imagem (último grupo de 6 dígitos,
+    ex.: '13_P1_2069_135183.jpg' -> '135183'), ou None.
+    """
+    if not image_name:
+        return None
+    base_name = os.path.splitext(os.path.basename(str(image_name).replace("\\", "/")))[0]
+    matches = re.findall(r"(?<!\d)(\d{6})(?!\d)", base_name)
+    return matches[-1] if matches else None
+
+
+class BufferedMeasurementStore(ForkAware, abc.ABC):
+    """
+    Base dos destinos de medição com buffer em memória.
+
+    As linhas (Timestamp, Imagem, Tipo, Indice, Valor) são acumuladas e gravadas
+    em bloco quando o buffer atinge buffer_size linhas, no máximo flush_interval
+    segundos depois da primeira linha pendente (por um timer, mesmo que nada
+    mais seja registrado, ex.: GUI parada), ou no encerramento do processo
+    (inclusive nos processos do pool do batch). As subclasses implementam
+    apenas _write_rows.
+
+    :param path: Caminho do arquivo de destino
+    :param buffer_size: Número de linhas que dispara a gravação
+    :param flush_interval: Intervalo máximo (s) entre gravações; None desativa
+    """
+
+    def __init__(self, path, buffer_size=200, flush_interval=5.0):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._check_process()
+
+    def _start_process(self, forked):
+        # Descarta o buffer herdado via fork para não gravar linhas do processo pai em duplicidade
+        if forked:
+            self._lock = threading.Lock()
+            self._rows = []
+            # A thread do timer não existe no processo filho
+            self._timer = None
+
+    def _at_exit(self):
+        self.flush()
+
+    def log(self, image_name, measurement_type, values):
+        """
+        Acrescenta as medições ao buffer, uma linha por valor.
+
+        :param image_name: Nome da imagem analisada
+        :param measurement_type: Tipo de medição (Comprimento ou Diâmetro)
+        :param values: Lista de valores medidos; vazia gera uma linha sem valor,
+                       para que a medição sem resultado também fique registrada
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [[timestamp, image_name, measurement_type, index, float(value)]
+                for index, value in enumerate(values)]
+        self.add_rows(rows or [[timestamp, image_name, measurement_type, 0, None]])
+
+    def add_rows(self, rows):
+        """Acrescenta linhas prontas (Timestamp, Imagem, Tipo, Indice, Valor) ao buffer."""
+        self._check_process()
+        with self._lock:
+            self._rows.extend(rows)
+            due = len(self._rows) >= self.buffer_size or (
+                self.flush_interval is not None
+                and time.monotonic() - self._last_flush >= self.flush_interval)
+            if not due and self._rows and self.flush_interval is not None and self._timer is None:
+                # Garante a gravação das linhas pendentes mesmo sem novos registros
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def import_rows(self, rows):
+        """Acrescenta linhas lidas de outro log (ver import_csv_log)."""
+        self.add_rows(rows)
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Grava todas as linhas pendentes em uma única escrita."""
+        self._check_process()
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.monotonic()
+        if rows:
+            self._write_rows(rows)
+
+    @abc.abstractmethod
+    def _write_rows(self, rows):
+        """Grava as linhas (Timestamp, Imagem, Tipo, Indice, Valor) no destino."""
+
+
+class MeasurementLogger(BufferedMeasurementStore):
+    """
+    Log de medições em CSV. Cada gravação é feita sob uma trava de arquivo,
+    de modo que vários processos podem registrar no mesmo CSV.
+    """
+
+    def __init__(self, path=LOG_FILE, buffer_size=200, flush_interval=5.0):
+        super().__init__(path, buffer_size, flush_interval)
+
+    def _write_rows(self, rows):
+        with _file_lock(self.path):
+            with open(self.path, mode="a", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                # Criar cabeçalho se o arquivo for novo
+                if file.tell() == 0:
+                    writer.writerow(LOG_HEADER)
+                writer.writerows(rows)
+
+
+class SQLiteMeasurementStore(BufferedMeasurementStore):
+    """
+    Histórico de medições em SQLite, indexado por data, imagem, lote e tipo,
+    para consultas rápidas (ex.: todos os diâmetros de um lote numa semana).
+    O SQLite cuida da concorrência entre processos.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS measurements (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            image TEXT,
+            lot TEXT,
+            type TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            value REAL
+        );
+        CREATE INDEX IF NOT EXISTS ix_measurements_timestamp ON measurements (timestamp);
+        CREATE INDEX IF NOT EXISTS ix_measurements_lot_type ON measurements (lot, type, timestamp);
+        CREATE INDEX IF NOT EXISTS ix_measurements_image ON measurements (image);
+        DROP INDEX IF EXISTS ux_measurements_row;
+    """
+
+    def __init__(self, path=DB_FILE, buffer_size=200, flush_interval=5.0):
+        super().__init__(path, buffer_size, flush_interval)
+        connection = self._connect()
+        try:
+            with connection:
+                # O índice único de versões anteriores descartava medições repetidas legítimas
+                connection.executescript(self.SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _write_rows(self, rows):
+        records = [(timestamp, _normalize_image(image), extract_lot(image), measurement_type, index, value)
+                   for timestamp, image, measurement_type, index, value in rows]
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO measurements (timestamp, image, lot, type, idx, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    records)
+        finally:
+            connection.close()
+
+    def import_rows(self, rows):
+        """
+        Importa linhas de outro log sem duplicar as que o histórico já tem.
+
+        Uma linha só é gravada se o histórico tiver menos ocorrências dela (mesma
+        data, imagem, tipo, índice e valor) do que as lidas do log até ali. Assim
+        reimportar o mesmo arquivo não acrescenta nada, e medições repetidas no
+        mesmo segundo com o mesmo valor (ex.: clique duplo) continuam todas lá.
+        Só a importação faz essa verificação; o registro normal grava tudo.
+
+        :param rows: Todas as linhas do log (Timestamp, Imagem, Tipo, Indice, Valor)
+        :return: Número de linhas gravadas
+        """
+        self.flush()
+        seen = Counter()
+        added = 0
+        connection = self._connect()
+        try:
+            with connection:
+                for timestamp, image, measurement_type, index, value in rows:
+                    key = (timestamp, _normalize_image(image), measurement_type, index, value)
+                    seen[key] += 1
+                    existing = connection.execute(
+                        "SELECT COUNT(*) FROM measurements "
+                        "WHERE timestamp = ? AND image IS ? AND type = ? AND idx = ? AND value IS ?",
+                        key).fetchone()[0]
+                    if existing < seen[key]:
+                        connection.execute(
+                            "INSERT INTO measurements (timestamp, image, lot, type, idx, value) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (timestamp, key[1], extract_lot(image), measurement_type, index, value))
+                        added += 1
+        finally:
+            connection.close()
+        return added
+
+    def row_count(self):
+        """Número de linhas gravadas (as pendentes no buffer são gravadas antes)."""
+        self.flush()
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+        finally:
+            connection.close()
+
+    def query(self, lot=None, measurement_type=None, image=None, start=None, end=None):
+        """
+        Consulta o histórico (as linhas pendentes no buffer são gravadas antes).
+
+        :param lot: Número do lote (ex.: '135183')
+        :param measurement_type: Tipo de medição (ex.: 'Diâmetros')
+        :param image: Caminho da imagem (exato) ou padrão LIKE com '%'
+        :param start: Data/hora inicial 'AAAA-MM-DD[ HH:MM:SS]' (inclusiva)
+        :param end: Data/hora final (exclusiva)
+        :return: Lista de (timestamp, image, lot, type, idx, value)
+        """
+        self.flush()
+        clauses, params = [], []
+        if lot is not None:
+            clauses.append("lot = ?")
+            params.append(str(lot))
+        if measurement_type is not None:
+            clauses.append("type = ?")
+            params.append(measurement_type)
+        if image is not None:
+            clauses.append("image LIKE ?" if "%" in image else "image = ?")
+            params.append(_normalize_image(image))
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(str(end))
+
+        sql = "SELECT timestamp, image, lot, type, idx, value FROM measurements"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+
+        connection = self._connect()
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+
+def _normalize_image(image_name):
+    """Caminhos com '/' para que o mesmo arquivo tenha a mesma chave no Windows e no Linux."""
+    return str(image_name).replace("\\", "/") if image_name is not None else None
+
+
+def open_store(spec=None):
+    """
+    Cria o destino de medições a partir de uma especificação 'tipo[:caminho]'.
+
+    :param spec: 'csv', 'sqlite', 'csv:arquivo.csv' ou 'sqlite:arquivo.db';
+                 se None, usa a variável de ambiente SIZEIT_STORE (padrão 'csv')
+    """
+    spec = spec or os.environ.get("SIZEIT_STORE", "csv")
+    kind, _, path = spec.partition(":")
+    if kind == "csv":
+        return MeasurementLogger(path or LOG_FILE)
+    if kind == "sqlite":
+        return SQLiteMeasurementStore(path or DB_FILE)
+    raise ValueError(f"Destino de medições desconhecido: {spec}")
+
+
+def _read_text_lines(path):
+    # O log antigo foi gravado no Windows (cp1252); os novos em UTF-8
+    try:
+        with open(path, newline="", encoding="utf-8") as file:
+            return file.read().splitlines()
+    except UnicodeDecodeError:
+        with open(path, newline="", encoding="cp1252") as file:
+            return file.read().splitlines()
+
+
+def import_csv_log(csv_path, store):
+    """
+    Importa um log CSV para o store. No SQLite a importação é idempotente:
+    linhas já presentes no histórico não são gravadas de novo (ver
+    SQLiteMeasurementStore.import_rows).
+
+    Aceita o formato antigo (Timestamp, Imagem, Tipo, Valores com listas como
+    '[np.float64(6.19), ...]') e o formato atual com uma linha por valor.
+
+    :return: Número de valores lidos do CSV
+    """
+    reader = csv.reader(_read_text_lines(csv_path))
+    header = next(reader, None)
+    imported = []
+    for row in reader:
+        if not row:
+            continue
+        if header == LOG_HEADER:
+            timestamp, image, measurement_type, index, value = row
+            rows = [[timestamp, image, measurement_type, int(index), float(value) if value != "" else None]]
+        else:
+            timestamp, image, measurement_type, values = row[:4]
+            numbers = re.findall(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", re.sub(r"np\.float\d*", "", values))
+            rows = [[timestamp, image, measurement_type, index, float(number)]
+                    for index, number in enumerate(numbers)]
+        imported.extend(rows)
+    store.import_rows(imported)
+    store.flush()
+    return len(imported)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa e consulta o histórico de medições do SizeIT.")
+    parser.add_argument("--db", default=DB_FILE, help="Banco SQLite do histórico")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Importa um log CSV (antigo ou atual)")
+    importer.add_argument("csv_path", nargs="?", default=LEGACY_LOG_FILE)
+
+    query = commands.add_parser("query", help="Consulta medições")
+    query.add_argument("--lot")
+    query.add_argument("--type", dest="measurement_type")
+    query.add_argument("--image")
+    query.add_argument("--start")
+    query.add_argument("--end")
+    args = parser.parse_args(argv)
+
+    store = SQLiteMeasurementStore(args.db)
+    if args.command == "import":
+        before = store.row_count()
+        count = import_csv_log(args.csv_path, store)
+        added = store.row_count() - before
+        print(f"{count} valores lidos de {args.csv_path}: {added} novos em {args.db}, {count - added} já existentes")
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["Timestamp", "Imagem", "Lote", "Tipo", "Indice", "Valor"])
+        writer.writerows(store.query(args.lot, args.measurement_type, args.image, args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from forkaware import ForkAware
+
+# Limites (s) dos intervalos do histograma de tempo por etapa
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Amostras guardadas por etapa para os percentis (as mais recentes)
+MAX_SAMPLES = 10000
+_profiler = None
+
+
+class StageStats:
+    """Agregado de uma etapa: contagem, tempos, histograma, pico de memória e tamanho das imagens."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.peak_memory = 0
+        self.pixels = 0
+        self.shape = None
+
+    def add(self, seconds, peak_memory=None, shape=None):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        for index, limit in enumerate(BUCKETS):
+            if seconds <= limit:
+                self.buckets[index] += 1
+                break
+        self.samples.append(seconds)
+        if peak_memory is not None:
+            self.peak_memory = max(self.peak_memory, peak_memory)
+        if shape is not None:
+            self.shape = tuple(shape)
+            self.pixels += shape[0] * shape[1]
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def as_dict(self):
+        cumulative, running = {}, 0
+        for limit, count in zip(BUCKETS, self.buckets):
+            running += count
+            cumulative[str(limit)] = running
+        cumulative["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else None,
+            "min_s": self.min,
+            "max_s": self.max,
+            "p50_s": self.percentile(50),
+            "p95_s": self.percentile(95),
+            "histogram": cumulative,
+            "peak_memory_bytes": self.peak_memory,
+            "megapixels": self.pixels / 1e6,
+            "last_shape": list(self.shape) if self.shape else None,
+        }
+
+
+class _StageTimer:
+    """Contexto devolvido por Profiler.stage; a imagem pode ser informada dentro do bloco (timer.image = ...)."""
+
+    def __init__(self, profiler, name, image):
+        self.profiler = profiler
+        self.name = name
+        self.image = image
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.profiler._exit(self, seconds)
+        return False
+
+
+class _NullTimer:
+    # Compartilhado por todas as etapas com o Profiler desligado: a imagem informada é ignorada
+    image = property(lambda self: None, lambda self, value: None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Profiler(ForkAware):
+    """
+    Instrumentação leve das etapas do pipeline de medição.
+
+    Cada etapa medida com stage() registra o tempo
+    de parede, o tamanho da imagem e, com trace_memory=True, o pico de memória
+    alocada durante a etapa (tracemalloc; inclui os arrays do NumPy/OpenCV).
+    Os tempos são agregados em histogramas por etapa e podem ser exportados
+    em JSON ou no formato texto do Prometheus.
+
+    O pico de memória é o do processo inteiro durante a etapa, então inclui o
+    que outras threads alocarem ao mesmo tempo (ex.: gravação do artifacts).
+    Etapas aninhadas são suportadas.
+
+    :param enabled: Se False, stage() não mede nada (custo desprezível)
+    :param trace_memory: Mede também o pico de memória (deixa as etapas mais lentas)
+    :param path: Arquivo exportado no fim do processo (ver export); nos processos
+                 filhos (ex.: pool do batch) vira '<nome>-<pid><ext>'
+    """
+
+    # Exporta depois da gravação pendente dos destinos de medição e de imagens (prioridade 10)
+    exit_priority = 5
+
+    def __init__(self, enabled=True, trace_memory=False, path=None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.path = path
+        self.started = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if enabled and trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._check_process()
+
+    def _start_process(self, forked):
+        # Descarta as medições herdadas via fork (cada processo do pool tem as suas)
+        if forked:
+            self._lock = threading.Lock()
+            self._stats = {}
+            self.started = time.time()
+
+    def _at_exit(self):
+        if not (self.enabled and self.path):
+            return
+        path = self.path
+        if multiprocessing.parent_process() is not None:
+            base_name, ext = os.path.splitext(path)
+            path = f"{base_name}-{os.getpid()}{ext}"
+        self.export(path)
+
+    def stage(self, name, image=None):
+        """
+        Contexto que mede uma etapa.
+
+            with profiler.stage("imread") as timer:
+                timer.image = cv2.imread(path)
+
+        :param name: Nome da etapa
+        :param image: Imagem (array) processada, para registrar o tamanho
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name, image)
+
+    def record(self, name, seconds, peak_memory=None, shape=None):
+        """Registra uma medição feita por fora (ex.: tempos do pipeline.Pipeline)."""
+        if not self.enabled:
+            return
+        self._check_process()
+        with self._lock:
+            self._stats.setdefault(name, StageStats()).add(seconds, peak_memory, shape)
+
+    def _enter(self, timer):
+        if not (self.trace_memory and tracemalloc.is_tracing()):
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # O pico acumulado até aqui pertence também às etapas externas
+            stack[-1].peak = max(stack[-1].peak, peak)
+        timer.base = timer.peak = current
+        tracemalloc.reset_peak()
+        stack.append(timer)
+
+    def _exit(self, timer, seconds):
+        peak_memory = None
+        stack = getattr(self._local, "stack", None)
+        if stack and stack[-1] is timer:
+            stack.pop()
+            timer.peak = max(timer.peak, tracemalloc.get_traced_memory()[1])
+            peak_memory = timer.peak - timer.base
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, timer.peak)
+        shape = getattr(timer.image, "shape", None)
+        self.record(timer.name, seconds, peak_memory, shape[:2] if shape is not None else None)
+
+    def summary(self):
+        """Dicionário {etapa: estatísticas} com histograma cumulativo e percentis."""
+        self._check_process()
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def to_json(self):
+        return json.dumps({"started": self.started, "pid": os.getpid(), "stages": self.summary()}, indent=2)
+
+    def to_prometheus(self, prefix="sizeit"):
+        """Texto no formato de exposição do Prometheus (para o textfile collector do node_exporter)."""
+        summary = self.summary()
+        lines = [f"# HELP {prefix}_stage_seconds Tempo de parede por etapa do pipeline",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for name, stats in summary.items():
+            for limit, count in stats["histogram"].items():
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{limit}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_s"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines += [f"# HELP {prefix}_stage_peak_memory_bytes Maior pico de memória alocada numa execução da etapa",
+                  f"# TYPE {prefix}_stage_peak_memory_bytes gauge"]
+        lines += [f'{prefix}_stage_peak_memory_bytes{{stage="{name}"}} {stats["peak_memory_bytes"]}'
+                  for name, stats in summary.items()]
+        lines += [f"# HELP {prefix}_stage_pixels_total Pixels processados pela etapa",
+                  f"# TYPE {prefix}_stage_pixels_total counter"]
+        lines += [f'{prefix}_stage_pixels_total{{stage="{name}"}} {round(stats["megapixels"] * 1e6)}'
+                  for name, stats in summary.items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Grava as medições em JSON ('.json') ou no formato do Prometheus (outras
+        extensões, ex.: '.prom'). A gravação é atômica (arquivo temporário + replace).
+        """
+        text = self.to_json() if path.lower().endswith(".json") else self.to_prometheus()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+    def report(self):
+        """Tabela resumida das etapas, da mais cara para a mais barata (tempo total)."""
+        summary = sorted(self.summary().items(), key=lambda item: item[1]["total_s"], reverse=True)
+        lines = [f"{'etapa':16} {'n':>6} {'total (s)':>10} {'média (ms)':>11} {'p95 (ms)':>9} {'pico (MB)':>10}"]
+        for name, stats in summary:
+            lines.append(f"{name:16} {stats['count']:6d} {stats['total_s']:10.3f} {1000 * stats['mean_s']:11.2f} "
+                         f"{1000 * stats['p95_s']:9.2f} {stats['peak_memory_bytes'] / 1e6:10.1f}")
+        return "\n".join(lines)
+
+
+def open_profiler(spec=None, path=None):
+    """
+    Cria o Profiler a partir de uma especificação.
+
+    :param spec: 'off', 'time' ou 'memory' (tempo + tracemalloc); se None, usa a
+                 variável de ambiente SIZEIT_METRICS (padrão 'off')
+    :param path: Arquivo exportado no fim do processo (.json ou .prom); se None,
+                 usa a variável de ambiente SIZEIT_METRICS_FILE
+    """
+    spec = spec or os.environ.get("SIZEIT_METRICS", "off")
+    if spec not in ("off", "time", "memory"):
+        raise ValueError(f"Nível de métricas desconhecido: {spec}")
+    return Profiler(enabled=spec != "off", trace_memory=spec == "memory",
+                    path=path or os.environ.get("SIZEIT_METRICS_FILE"))
+
+
+def get_profiler():
+    """Profiler do processo, criado no primeiro uso (ver open_profiler)."""
+    global _profiler
+    if _profiler is None:
+        _profiler = open_profiler()
+    return _profiler
+
+
+def set_profiler(profiler):
+    """Troca o Profiler do processo (ex.: Profiler() num benchmark)."""
+    global _profiler
+    _profiler = profiler
+
+
+def stage(name, image=None):
+    """Mede uma etapa no Profiler do processo (ver Profiler.stage)."""
+    return get_profiler().stage(name, image)
+
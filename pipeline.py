@@ -0,0 +1,73 @@
+import time
+from collections import namedtuple
+
+from artifacts import get_sink
+from metrics import get_profiler
+
+# Etapa do pipeline: nome (também o nome do resultado), função, nomes dos
+# resultados usados como argumentos, sufixo do arquivo gravado (ou None) e
+# nome da etapa nas métricas (ver metrics.py)
+Stage = namedtuple("Stage", ["name", "func", "inputs", "artifact", "metric"])
+
+
+class Pipeline:
+    """
+    Sequência de etapas sobre arrays em memória.
+
+    Cada etapa recebe resultados anteriores pelo nome e o seu resultado fica
+    disponível para as seguintes, sem passar pelo disco. O tempo de cada etapa
+    é medido e registrado também no Profiler do metrics; a gravação das imagens
+    é opcional e feita pelo destino do artifacts (em segundo plano, fora do
+    tempo das etapas). Por isso as etapas não devem alterar os arrays que recebem.
+
+    Exemplo:
+        pipeline = (Pipeline()
+                    .add("gray", lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+                    .add("edges", lambda gray: cv2.Canny(gray, 50, 150), artifact="_canny.png"))
+        results, timings = pipeline.run(image=image, base_name="peca")
+    """
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    def add(self, name, func, inputs=None, artifact=None, metric=None):
+        """
+        Acrescenta uma etapa e devolve o próprio pipeline (para encadear).
+
+        :param name: Nome da etapa e do seu resultado
+        :param func: Função chamada com os resultados listados em inputs
+        :param inputs: Nomes dos argumentos; padrão: o resultado da etapa anterior
+                       (ou 'image', na primeira etapa)
+        :param artifact: Sufixo do arquivo gravado com o resultado (ex.: '_canny.jpg')
+        :param metric: Nome da etapa nas métricas (padrão: name), para agrupar com
+                       as mesmas operações de outros módulos (ex.: 'canny')
+        """
+        if inputs is None:
+            inputs = (self.stages[-1].name,) if self.stages else ("image",)
+        elif isinstance(inputs, str):
+            inputs = (inputs,)
+        self.stages.append(Stage(name, func, tuple(inputs), artifact, metric or name))
+        return self
+
+    def run(self, base_name=None, source=None, sink=None, **values):
+        """
+        Executa as etapas em ordem.
+
+        :param base_name: Caminho sem extensão usado nos arquivos gravados; None não grava nada
+        :param source: Identificador da peça para o nível 'sampled' (padrão: base_name)
+        :param sink: ArtifactSink usado na gravação (padrão: artifacts.get_sink())
+        :param values: Entradas iniciais (ex.: image=...)
+        :return: (dicionário com todas as entradas e resultados, {etapa: segundos})
+        """
+        sink = sink or get_sink()
+        profiler = get_profiler()
+        timings = {}
+        for stage in self.stages:
+            start = time.perf_counter()
+            with profiler.stage(stage.metric) as timer:
+                output = timer.image = stage.func(*(values[name] for name in stage.inputs))
+            timings[stage.name] = time.perf_counter() - start
+            values[stage.name] = output
+            if stage.artifact and base_name:
+                sink.save(base_name + stage.artifact, output, source=source or base_name, copy=False)
+        return values, timings
@@ -1,7 +1,10 @@
 import cv2
 import numpy as np
 import os
-from background import remove_background
+from artifacts import save_artifact
+from background import apply_mask, get_session, predict_mask
+from metrics import stage
+from pipeline import Pipeline
 
 roi_points = []  # Lista para armazenar os pontos da ROI
 
@@ -62,22 +65,54 @@ def back_projection(image_path):
 
     # **Passo 6: Salvar as imagens resultantes**
     base_name, _ = os.path.splitext(image_path)
-    cv2.imwrite(base_name + "_backproj_mask.jpg", mask)
-    cv2.imwrite(base_name + "_backproj_result.jpg", result)
+    save_artifact(base_name + "_backproj_mask.jpg", mask, source=image_path, copy=False)
+    save_artifact(base_name + "_backproj_result.jpg", result, source=image_path, copy=False)
 
     print(f"Sucessfull segmented ! Processed image saved on :\n- {base_name}_backproj_mask.jpg\n- {base_name}_backproj_result.jpg")
     print(f"Processed image : {base_name}.")
 
 
-def fill_gaps(image_path):
-    """Preenche áreas dentro das bordas detectadas no Canny, simulando um preenchimento de área fechado e suave."""
-    
-    if not os.path.exists(image_path):
-        print(f"Erro: Arquivo '{image_path}' não encontrado.")
-        return
-    
-    # Carregar a imagem do Canny
-    edges = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+def _load_edges(source, suffix):
+    """
+    Bordas do Canny em memória (array) ou lidas de '<nome>_canny.jpg'.
+
+    :return: (bordas, caminho de saída com o sufixo no lugar de '_canny.jpg') ou (None, None)
+    """
+    if isinstance(source, np.ndarray):
+        return source, None
+    if not os.path.exists(source):
+        print(f"Erro: Arquivo '{source}' não encontrado.")
+        return None, None
+    base_name, _ = os.path.splitext(source)
+    if base_name.endswith("_canny"):
+        base_name = base_name[:-len("_canny")]
+    return cv2.imread(source, cv2.IMREAD_GRAYSCALE), base_name + suffix
+
+def fill_gaps(edges, output_path=None, source=None):
+    """
+    Preenche áreas dentro das bordas detectadas no Canny, simulando um preenchimento de área fechado e suave.
+
+    :param edges: Bordas do Canny (array) ou caminho do '<nome>_canny.jpg'
+    :param output_path: Caminho da imagem gravada (padrão: '<nome>_filled_smooth.jpg' se edges for caminho)
+    :param source: Identificador da peça para o nível 'sampled' do artifacts
+    :return: Imagem preenchida (array) ou None
+    """
+    edges, default_path = _load_edges(edges, "_filled_smooth.jpg")
+    if edges is None:
+        return None
+    output_path = output_path or default_path
+    filled_result = fill_edge_gaps(edges)
+
+    # Salvar a imagem final (opcional, em segundo plano)
+    if save_artifact(output_path, filled_result, source=source or output_path, copy=False):
+        print(f"Fload Fill processed : {output_path}")
+        base_name, _ = os.path.splitext(output_path)
+        print(f"Processed image : {base_name}.")
+
+    return filled_result
+
+def fill_edge_gaps(edges):
+    """Preenchimento das bordas do Canny (array) em memória; ver fill_gaps."""
 
     # **Passo 1: Fechamento morfológico suave**
     kernel = np.ones((3, 3), np.uint8)  # Reduzimos o kernel para manter detalhes finos
@@ -113,23 +148,33 @@ def fill_gaps(image_path):
         cv2.line(filled_result, leftmost, rightmost, 255, 1)
         cv2.line(filled_result, topmost, bottommost, 255, 1)
 
-    # **Passo 7: Salvar a imagem final**
-    output_path = image_path.replace("_canny.jpg", "_filled_smooth.jpg")
-    cv2.imwrite(output_path, filled_result)
+    return filled_result
 
-    print(f"Fload Fill processed : {output_path}")
-    base_name, _ = os.path.splitext(output_path)
-    print(f"Processed image : {base_name}.")
+def connect_contours(edges, output_path=None, source=None):
+    """
+    Conecta todas as bordas detectadas pelo Canny em uma linha contínua.
 
-def connect_contours(canny_image_path):
-    """Conecta todas as bordas detectadas pelo Canny em uma linha contínua."""
-    
-    if not os.path.exists(canny_image_path):
-        print(f"Erro: Arquivo '{canny_image_path}' não encontrado.")
-        return
-    
-    # Carregar a imagem binária (Canny)
-    edges = cv2.imread(canny_image_path, cv2.IMREAD_GRAYSCALE)
+    :param edges: Bordas do Canny (array) ou caminho do '<nome>_canny.jpg'
+    :param output_path: Caminho da imagem gravada (padrão: '<nome>_connected.jpg' se edges for caminho)
+    :param source: Identificador da peça para o nível 'sampled' do artifacts
+    :return: Imagem com a linha contínua (array) ou None
+    """
+    edges, default_path = _load_edges(edges, "_connected.jpg")
+    if edges is None:
+        return None
+    output_path = output_path or default_path
+    connected_image = connect_edge_contours(edges)
+
+    # Salvar a imagem com a linha contínua (opcional, em segundo plano)
+    if save_artifact(output_path, connected_image, source=source or output_path, copy=False):
+        print(f"Continous line  : {output_path}")
+        base_name, _ = os.path.splitext(output_path)
+        print(f"Processed image : {base_name}.")
+
+    return connected_image
+
+def connect_edge_contours(edges):
+    """Linha contínua sobre os contornos das bordas do Canny (array) em memória; ver connect_contours."""
 
     # Encontrar os contornos na imagem binária
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -155,38 +200,25 @@ def connect_contours(canny_image_path):
         if len(approx) > 2:
             cv2.line(connected_image, tuple(approx[-1][0]), tuple(approx[0][0]), (255, 255, 255), 1)
 
-    # Salvar a imagem com a linha contínua
-    output_path = canny_image_path.replace("_canny.jpg", "_connected.jpg")
-    cv2.imwrite(output_path, connected_image)
+    return connected_image
 
-    print(f"Continous line  : {output_path}")
-    base_name, _ = os.path.splitext(output_path)
-    print(f"Processed image : {base_name}.")
 
+def _to_bgr(image):
+    # A saída do rembg é BGRA; como no antigo '_no_bg.png' relido pelo imread, o alfa é descartado
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR) if image.ndim == 3 and image.shape[2] == 4 else image
 
-def process_image(image_path):
-    if not os.path.exists(image_path):
-        print(f"Erro: Arquivo '{image_path}' não encontrado.")
-        return
-    
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # Redução de ruído
-    blurred = cv2.medianBlur(gray, 7)
-
-    # Canny com limiar adaptativo (usando Otsu)
+def _otsu_threshold(blurred):
     otsu_thresh, _ = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    lower_thresh = 0.1 * otsu_thresh
-    upper_thresh = 1.0 * otsu_thresh
-    edges = cv2.Canny(blurred, lower_thresh, upper_thresh)
+    return otsu_thresh
 
+def _hough_circles(edges, otsu_thresh):
     # Transformada de Hough refinada
-    circles = cv2.HoughCircles(
+    return cv2.HoughCircles(
         edges, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
-        param1=upper_thresh, param2=50, minRadius=5, maxRadius=100
+        param1=otsu_thresh, param2=50, minRadius=5, maxRadius=100
     )
 
+def _draw_contours(image, edges):
     contour_image = image.copy()
     contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
@@ -194,18 +226,61 @@ def process_image(image_path):
     min_contour_area = 1
     filtered_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_contour_area]
     cv2.drawContours(contour_image, filtered_contours, -1, (0, 255, 0), 2)
-
-    # Salvar imagens
+    return contour_image
+
+def build_pipeline(remove_bg=False, session=None):
+    """
+    Etapas do process_image encadeadas em memória (ver pipeline.Pipeline).
+
+    :param remove_bg: Se True, a primeira etapa remove o fundo com o rembg
+                      (antes gravado e relido como '_no_bg.png')
+    :param session: Sessão do rembg (padrão: background.get_session())
+    """
+    pipeline = Pipeline()
+    if remove_bg:
+        pipeline.add("no_bg", lambda image: apply_mask(image, predict_mask(image, session)), artifact=".png")
+    return (pipeline
+            .add("bgr", _to_bgr)
+            .add("gray", lambda image: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            # Redução de ruído
+            .add("blurred", lambda gray: cv2.medianBlur(gray, 7), metric="blur")
+            # Canny com limiar adaptativo (usando Otsu)
+            .add("otsu", _otsu_threshold)
+            .add("edges", lambda blurred, otsu: cv2.Canny(blurred, 0.1 * otsu, 1.0 * otsu),
+                 inputs=("blurred", "otsu"), artifact="_canny.jpg", metric="canny")
+            .add("circles", _hough_circles, inputs=("edges", "otsu"), metric="hough_circles")
+            .add("contour_image", _draw_contours, inputs=("bgr", "edges"), artifact="_contornos.jpg")
+            # As etapas seguintes recebem as bordas exatas, sem a compressão do JPEG
+            .add("filled", fill_edge_gaps, inputs="edges", artifact="_filled_smooth.jpg")
+            .add("connected", connect_edge_contours, inputs="edges", artifact="_connected.jpg"))
+
+def process_image(image_path, remove_bg=False, session=None, sink=None):
+    """
+    Processa uma imagem com o pipeline em memória; os arquivos intermediários
+    são gravados conforme o destino do artifacts.
+
+    :param image_path: Caminho da imagem
+    :param remove_bg: Remove o fundo (rembg) antes; os arquivos recebem o sufixo '_no_bg'
+    :param session: Sessão do rembg reaproveitada entre imagens
+    :param sink: ArtifactSink (padrão: artifacts.get_sink())
+    :return: Dicionário com os resultados de cada etapa, ou None
+    """
+    if not os.path.exists(image_path):
+        print(f"Erro: Arquivo '{image_path}' não encontrado.")
+        return
+    
+    with stage("imread") as timer:
+        image = timer.image = cv2.imread(image_path)
     base_name, _ = os.path.splitext(image_path)
-    cv2.imwrite(base_name + "_canny.jpg", edges)
-    cv2.imwrite(base_name + "_contornos.jpg", contour_image)
-
-    fill_gaps(base_name + "_canny.jpg")
-    connect_contours(base_name + "_canny.jpg")
-
-    print(f"Processed image {base_name}.")
+    if remove_bg:
+        base_name += "_no_bg"
 
+    results, timings = build_pipeline(remove_bg, session).run(
+        base_name=base_name, source=image_path, sink=sink, image=image)
 
+    stage_times = ", ".join(f"{name} {1000 * seconds:.1f}ms" for name, seconds in timings.items())
+    print(f"Processed image {base_name}. ({stage_times})")
+    return results
 
 
 file_list = [
@@ -232,7 +307,8 @@ file_list = [
 # process_image(imagepath_nobg)
 
 
-for name in file_list:
-    imagepath_nobg = remove_background(name)
-    print(f"path da imgem sem bg : {imagepath_nobg}")
-    process_image(imagepath_nobg)
+if __name__ == "__main__":
+    # Uma única sessão do rembg para todas as imagens; a imagem sem fundo segue em memória
+    session = get_session()
+    for imagepath in file_list:
+        process_image(imagepath, remove_bg=True, session=session)
@@ -1,9 +1,15 @@
 import cv2
 import numpy as np
 import os
+from grabcut_multiscale import DEFAULT_SCALE, grabcut_mask
 
-def remove_background_grabcut_custom(image_path, low_thresh, high_thresh):
-    """Remove o fundo da imagem usando GrabCut com máscara baseada nos limiares do Canny."""
+def remove_background_grabcut_custom(image_path, low_thresh, high_thresh, scale=DEFAULT_SCALE):
+    """
+    Remove o fundo da imagem usando GrabCut com máscara baseada nos limiares do Canny.
+
+    :param scale: Fator de redução da etapa grosseira do GrabCut multiescala
+                  (1.0 = GrabCut em resolução total)
+    """
 
     if not os.path.exists(image_path):
         print(f"Erro: Arquivo '{image_path}' não encontrado.")
@@ -20,15 +26,8 @@ def remove_background_grabcut_custom(image_path, low_thresh, high_thresh):
     mask = np.zeros(image.shape[:2], np.uint8)
     mask[edges > 0] = cv2.GC_PR_FGD  # Pixels com borda são marcados como provável primeiro plano
 
-    # Criar modelos de fundo e primeiro plano
-    bgd_model = np.zeros((1, 65), np.float64)
-    fgd_model = np.zeros((1, 65), np.float64)
-
-    # Aplicar GrabCut
-    cv2.grabCut(image, mask, None, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_MASK)
-
-    # Criar máscara binária final
-    mask_bin = np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 1, 0).astype('uint8')
+    # Aplicar GrabCut (reduzido + refinamento da borda em resolução total) e criar a máscara binária final
+    mask_bin = grabcut_mask(image, init_mask=mask, scale=scale)
 
     # Aplicar a máscara na imagem original
     result = image * mask_bin[:, :, np.newaxis]
@@ -44,5 +43,6 @@ def remove_background_grabcut_custom(image_path, low_thresh, high_thresh):
 
     print(f"Fundo removido (GrabCut com Canny ajustado)! Imagem salva em: {output_path}")
 
-image_path = r"C:\Users\alexandre.panosso\Dropbox\DPro\Microdont\09_Automacao_2025\AMOSTRAS DOS 09 LOTES EOCA\135183\1_2069_135183.jpg"
-remove_background_grabcut_custom(image_path, 40, 200)  # Substitua pelos valores escolhidos
\ No newline at end of file
+if __name__ == "__main__":
+    image_path = r"C:\Users\alexandre.panosso\Dropbox\DPro\Microdont\09_Automacao_2025\AMOSTRAS DOS 09 LOTES EOCA\135183\1_2069_135183.jpg"
+    remove_background_grabcut_custom(image_path, 40, 200)  # Substitua pelos valores escolhidos
\ No newline at end of file
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+# Registro dos métodos de segmentação: nome -> função(imagem BGR, **opções) -> máscara uint8 0/255
+BACKENDS = {}
+
+
+def register_backend(name):
+    """
+    Decorador que registra um método de segmentação.
+
+    A função recebe a imagem BGR (e opções nomeadas) e devolve uma máscara
+    uint8 do mesmo tamanho, com 255 na peça e 0 no fundo.
+    """
+    def decorator(func):
+        BACKENDS[name] = func
+        return func
+    return decorator
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Método de segmentação desconhecido: {name} (disponíveis: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def segment_mask(image, backend="canny", **options):
+    """Máscara da peça calculada pelo método escolhido."""
+    return get_backend(backend)(image, **options)
+
+
+def segment_piece(source, backend="canny", **options):
+    """
+    Segmenta a peça e devolve a análise pronta para as funções de medição
+    (align_piece, get_piece_length, sample_diameters, measure_diameters).
+
+    :param source: Caminho da imagem ou imagem BGR (array)
+    :param backend: Nome do método registrado (ver BACKENDS)
+    :return: sizeitCalibration.MaskAnalysis
+    """
+    import sizeitCalibration as sc
+
+    if isinstance(source, np.ndarray):
+        image_path, image = None, source
+    else:
+        image_path, image = source, cv2.imread(source)
+        if image is None:
+            raise ValueError(f"Não foi possível ler a imagem: {source}")
+    return sc.MaskAnalysis(segment_mask(image, backend, **options), image=image, image_path=image_path)
+
+
+def _fill_largest(mask_or_edges):
+    """Maior contorno externo preenchido."""
+    contours, _ = cv2.findContours(mask_or_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask = np.zeros(mask_or_edges.shape[:2], np.uint8)
+    if contours:
+        cv2.drawContours(mask, [max(contours, key=cv2.contourArea)], -1, 255, thickness=cv2.FILLED)
+    return mask
+
+
+@register_backend("canny")
+def canny_mask(image, blur_size=5, canny_threshold1=50, canny_threshold2=150):
+    """Canny + maior contorno (o mesmo critério do PieceAnalysis)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
+    return _fill_largest(cv2.Canny(blurred, canny_threshold1, canny_threshold2))
+
+
+@register_backend("adaptive")
+def adaptive_mask(image, block_size=11, c=2):
+    """Limiarização adaptativa + Canny + contornos preenchidos (como em imageprocess.py)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                   block_size, c)
+    return _fill_largest(cv2.Canny(thresh, 50, 150))
+
+
+@register_backend("rembg")
+def rembg_mask(image, max_side=1024):
+    """U²-Net (rembg) com a sessão compartilhada do processo (ver background.py)."""
+    from background import predict_mask  # rembg é opcional
+
+    return np.where(predict_mask(image, max_side=max_side) > 127, 255, 0).astype(np.uint8)
+
+
+@register_backend("grabcut")
+def grabcut_mask(image, margin=10, scale=0.25):
+    """GrabCut multiescala a partir de um retângulo quase do tamanho da imagem."""
+    from grabcut_multiscale import grabcut_mask as grabcut
+
+    h, w = image.shape[:2]
+    return grabcut(image, rect=(margin, margin, w - 2 * margin, h - 2 * margin), scale=scale) * 255
+
+
+@register_backend("watershed")
+def watershed_mask(image, profile="default"):
+    """Watershed com o perfil de parâmetros salvo e buracos preenchidos."""
+    from watershed_engine import fill_holes, load_params, segment
+
+    mask, _ = segment(image, load_params(profile))
+    return fill_holes(mask)
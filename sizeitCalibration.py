@@ -1,22 +1,31 @@
 import cv2
+import hashlib
+import inspect
 import json
+import os
 import numpy as np
-import csv
 from datetime import datetime
-import matplotlib.pyplot as plt
+from artifacts import save_artifact
+from measurement_log import open_store
+from metrics import stage
 
 # Variável global para o fator de escala do texto
 TEXT_SCALE_FACTOR = 800
-LOG_FILE = "SizeIT_log.csv"
+# Margem (pixels) ao redor da peça alinhada quando o alinhamento precisa de uma tela própria
+ALIGN_MARGIN = 20
+# Configuração e cache de calibrações ao lado do módulo, independentes do diretório de trabalho
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+CALIBRATION_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration_cache.json")
+_measurement_logger = None
 
 def save_calibration(pixel_to_mm):
-    with open("config.json", "w") as file:
+    with open(CONFIG_FILE, "w") as file:
         json.dump({"pixel_to_mm": pixel_to_mm}, file)
     print("Configuração salva!")
 
 def load_calibration():
     try:
-        with open("config.json", "r") as file:
+        with open(CONFIG_FILE, "r") as file:
             config = json.load(file)
             return config["pixel_to_mm"]
     except FileNotFoundError:
@@ -30,29 +39,48 @@ def set_text_scale(factor):
 def get_text_scale(w, h):
     return max(max(w, h) / TEXT_SCALE_FACTOR, 0.5)  # O mínimo será 0.5
 
+def get_measurement_logger():
+    """
+    Destino de medições do processo, criado no primeiro uso a partir da
+    variável de ambiente SIZEIT_STORE ('csv' por padrão, ver measurement_log.open_store).
+    """
+    global _measurement_logger
+    if _measurement_logger is None:
+        _measurement_logger = open_store()
+    return _measurement_logger
+
+def set_measurement_store(store):
+    """Troca o destino de medições (ex.: measurement_log.SQLiteMeasurementStore)."""
+    global _measurement_logger
+    if _measurement_logger is not None:
+        _measurement_logger.flush()
+    _measurement_logger = store
+
 def log_measurement(image_name, measurement_type, values):
     """
-    Registra as medições em um arquivo CSV.
+    Registra as medições no destino configurado (uma linha numérica por valor).
+    As linhas ficam em buffer e são gravadas em bloco (ver measurement_log).
     
     :param image_name: Nome da imagem analisada
     :param measurement_type: Tipo de medição (Comprimento ou Diâmetro)
     :param values: Lista de valores medidos
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        
-        # Criar cabeçalho se o arquivo for novo
-        if file.tell() == 0:
-            writer.writerow(["Timestamp", "Imagem", "Tipo", "Valores"])
-        
-        writer.writerow([timestamp, image_name, measurement_type, values])
+    with stage("log"):
+        get_measurement_logger().log(image_name, measurement_type, values)
+
+def flush_measurements():
+    """Força a gravação das medições pendentes no log."""
+    with stage("log_flush"):
+        get_measurement_logger().flush()
 
 
 def manual_calibration(image_path, real_diameter_mm=10):
     """
     Permite ao usuário definir manualmente a calibração clicando no centro e na borda do círculo.
     """
+    # Importado só aqui: o matplotlib é pesado e só a calibração manual o usa
+    import matplotlib.pyplot as plt
+
     image = cv2.imread(image_path)
     image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
@@ -82,20 +110,125 @@ def manual_calibration(image_path, real_diameter_mm=10):
     print("Erro: Não foram selecionados pontos suficientes.")
     return None
 
-def calibrate(image_path, real_diameter_mm=10, canny_threshold1=30, canny_threshold2=100, gaussian_blur_size=5, hough_param2=20, dp=1.0, minDist=100, minRadius=50, maxRadius=500):
+def fit_circle(points):
+    """
+    Ajuste algébrico (Kasa) de um círculo por mínimos quadrados.
+
+    :param points: Array Nx2 de coordenadas (x, y)
+    :return: (cx, cy, raio) em float
+    """
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+    A = np.column_stack([x, y, np.ones_like(x)])
+    b = x ** 2 + y ** 2
+    c, _, _, _ = np.linalg.lstsq(A, b, rcond=None)
+    cx, cy = c[0] / 2, c[1] / 2
+    return cx, cy, float(np.sqrt(c[2] + cx ** 2 + cy ** 2))
+
+def _refine_circle(gray, cx, cy, radius, band, canny_threshold1, canny_threshold2, gaussian_blur_size):
+    """
+    Refina centro e raio em resolução total usando só as bordas de um anel
+    estreito (raio +- band) em torno da estimativa grosseira.
+
+    :return: (cx, cy, raio, confiança) ou None se houver poucas bordas no anel;
+             a confiança é a fração dos 360 graus com borda de suporte
+    """
+    h, w = gray.shape[:2]
+    reach = int(np.ceil(radius + band)) + gaussian_blur_size
+    x0, y0 = max(int(cx) - reach, 0), max(int(cy) - reach, 0)
+    x1, y1 = min(int(cx) + reach + 1, w), min(int(cy) + reach + 1, h)
+    
+    crop = cv2.GaussianBlur(gray[y0:y1, x0:x1], (gaussian_blur_size, gaussian_blur_size), 0)
+    edges = cv2.Canny(crop, canny_threshold1, canny_threshold2)
+    points = np.argwhere(edges > 0)[:, ::-1] + (x0, y0)
+    
+    # Duas iterações: a segunda com o anel mais estreito em torno do novo ajuste
+    for width in (band, max(band / 2, 1.5)):
+        distance = np.hypot(points[:, 0] - cx, points[:, 1] - cy)
+        inliers = points[np.abs(distance - radius) <= width]
+        if len(inliers) < 20:
+            return None
+        cx, cy, radius = fit_circle(inliers)
+    
+    angles = np.degrees(np.arctan2(inliers[:, 1] - cy, inliers[:, 0] - cx)).astype(int) % 360
+    confidence = len(np.unique(angles)) / 360
+    return cx, cy, radius, confidence
+
+def detect_circle_pyramid(gray, levels=2, canny_threshold1=30, canny_threshold2=100, gaussian_blur_size=5,
+                          hough_param2=20, dp=1.0, minDist=100, minRadius=50, maxRadius=500):
+    """
+    Busca do círculo de referência em pirâmide: HoughCircles numa imagem
+    reduzida 2**levels vezes e refinamento sub-pixel em resolução total apenas
+    no anel em torno do círculo encontrado.
+
+    :return: (cx, cy, raio, confiança) em pixels da imagem original, ou None
+    """
+    scale = 2 ** levels
+    small = gray
+    for _ in range(levels):
+        small = cv2.pyrDown(small)
+    
+    with stage("blur", small):
+        blurred = cv2.GaussianBlur(small, (gaussian_blur_size, gaussian_blur_size), 0)
+    with stage("canny", blurred):
+        edges = cv2.Canny(blurred, canny_threshold1, canny_threshold2)
+    with stage("hough_circles", edges):
+        circles = cv2.HoughCircles(edges, cv2.HOUGH_GRADIENT, dp=dp, minDist=max(minDist / scale, 1),
+                                   param1=canny_threshold2, param2=hough_param2,
+                                   minRadius=max(int(minRadius / scale), 1), maxRadius=int(np.ceil(maxRadius / scale)))
+    if circles is None:
+        return None
+    
+    # Círculo mais votado, levado para a escala original
+    x, y, radius = circles[0, 0] * scale
+    refined = _refine_circle(gray, x, y, radius, 2 * scale + 2,
+                             canny_threshold1, canny_threshold2, gaussian_blur_size)
+    if refined is None:
+        return float(x), float(y), float(radius), 0.0
+    return refined
+
+def calibrate(image_path, real_diameter_mm=10, canny_threshold1=30, canny_threshold2=100, gaussian_blur_size=5, hough_param2=20, dp=1.0, minDist=100, minRadius=50, maxRadius=500,
+              pyramid_levels=0, return_details=False):
+    """
+    Calcula a relação pixels/mm a partir de um círculo de referência.
+
+    :param pyramid_levels: 0 mantém a busca em resolução total; N > 0 busca numa
+                           imagem reduzida 2**N vezes e refina em resolução total
+                           (ver detect_circle_pyramid)
+    :param return_details: Se True, retorna (pixels/mm, diâmetro em pixels, confiança);
+                           a confiança só é calculada no modo pirâmide (None caso contrário)
+    """
     # Carregar a imagem de calibração
-    image = cv2.imread(image_path)
+    with stage("imread") as timer:
+        image = timer.image = cv2.imread(image_path)
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
+    if pyramid_levels > 0:
+        circle = detect_circle_pyramid(gray, pyramid_levels, canny_threshold1, canny_threshold2, gaussian_blur_size,
+                                       hough_param2, dp, minDist, minRadius, maxRadius)
+        if circle is None:
+            print("Nenhum círculo detectado!")
+            return (None, None, None) if return_details else None
+        
+        _, _, radius, confidence = circle
+        diameter_pixels = 2 * radius
+        pixel_per_mm = diameter_pixels / real_diameter_mm
+        print(f"Diâmetro detectado (pixels): {diameter_pixels:.2f} (confiança {confidence:.2f})")
+        print(f"Relação pixels/mm: {pixel_per_mm}")
+        return (pixel_per_mm, diameter_pixels, confidence) if return_details else pixel_per_mm
+    
     # Aplicar um filtro Gaussiano para suavizar a imagem
-    blurred = cv2.GaussianBlur(gray, (gaussian_blur_size, gaussian_blur_size), 0)
+    with stage("blur", gray):
+        blurred = cv2.GaussianBlur(gray, (gaussian_blur_size, gaussian_blur_size), 0)
     
     # Detectar bordas usando Canny com parâmetros ajustáveis
-    edges = cv2.Canny(blurred, canny_threshold1, canny_threshold2)
+    with stage("canny", blurred):
+        edges = cv2.Canny(blurred, canny_threshold1, canny_threshold2)
     
     # Detectar círculos usando a Transformada de Hough com parâmetros ajustáveis
-    circles = cv2.HoughCircles(edges, cv2.HOUGH_GRADIENT, dp=dp, minDist=minDist,
-                                param1=canny_threshold2, param2=hough_param2, minRadius=minRadius, maxRadius=maxRadius)
+    with stage("hough_circles", edges):
+        circles = cv2.HoughCircles(edges, cv2.HOUGH_GRADIENT, dp=dp, minDist=minDist,
+                                    param1=canny_threshold2, param2=hough_param2, minRadius=minRadius, maxRadius=maxRadius)
     
     if circles is not None:
         circles = np.uint16(np.around(circles))
@@ -109,31 +242,625 @@ def calibrate(image_path, real_diameter_mm=10, canny_threshold1=30, canny_thresh
             print(f"Diâmetro detectado (pixels): {diameter_pixels}")
             print(f"Relação pixels/mm: {pixel_per_mm}")
             
-            return pixel_per_mm
+            return (pixel_per_mm, diameter_pixels, None) if return_details else pixel_per_mm
     
     print("Nenhum círculo detectado!")
-    return None
+    return (None, None, None) if return_details else None
 
-def align_image(image_path):
-    # Carregar a imagem
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def calibration_key(image_path, **calibrate_params):
+    """
+    Chave de cache da calibração: hash SHA-256 do conteúdo da imagem de
+    calibração mais todos os parâmetros efetivos de calibrate (incluindo os
+    valores padrão), de modo que a mudança de qualquer um invalida a entrada.
+
+    :return: (chave, parâmetros efetivos)
+    """
+    bound = inspect.signature(calibrate).bind(image_path, **calibrate_params)
+    bound.apply_defaults()
+    params = {name: value for name, value in bound.arguments.items()
+              if name not in ("image_path", "return_details")}
     
-    # Aplicar um filtro Gaussiano para suavizar a imagem
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest(), params
+
+def _load_calibration_cache(cache_file):
+    try:
+        with open(cache_file, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"entries": {}, "profiles": {}}
+
+def _save_calibration_cache(cache, cache_file):
+    # Gravação atômica para não corromper o cache se o processo for interrompido
+    tmp_path = cache_file + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(cache, file, indent=2)
+    os.replace(tmp_path, cache_file)
+
+def calibrate_cached(image_path, profile="default", cache_file=CALIBRATION_CACHE_FILE, **calibrate_params):
+    """
+    Calibra usando o cache: o HoughCircles só roda se a imagem de calibração
+    ou os parâmetros mudaram (ver calibration_key).
+
+    :param image_path: Caminho da imagem de calibração
+    :param profile: Nome do perfil de câmera/lente associado ao resultado
+    :param cache_file: Arquivo JSON do cache
+    :param calibrate_params: Parâmetros repassados a calibrate (exceto return_details)
+    :return: Relação pixels/mm ou None
+    """
+    calibrate_params.pop("return_details", None)
+    key, params = calibration_key(image_path, **calibrate_params)
+    cache = _load_calibration_cache(cache_file)
     
-    # Detectar bordas usando Canny
-    edges = cv2.Canny(blurred, 50, 150)
+    entry = cache["entries"].get(key)
+    is_new = entry is None
+    if is_new:
+        pixel_to_mm = calibrate(image_path, **calibrate_params)
+        if not pixel_to_mm:
+            return None
+        entry = {"pixel_to_mm": float(pixel_to_mm), "image": image_path, "params": params,
+                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        cache["entries"][key] = entry
+    else:
+        print(f"Calibração recuperada do cache: {entry['pixel_to_mm']}")
     
-    # Encontrar contornos
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if is_new or cache["profiles"].get(profile) != key:
+        cache["profiles"][profile] = key
+        _save_calibration_cache(cache, cache_file)
     
-    if not contours:
+    return entry["pixel_to_mm"]
+
+def load_profile_calibration(profile="default", cache_file=CALIBRATION_CACHE_FILE):
+    """Relação pixels/mm mais recente de um perfil do cache, ou None."""
+    cache = _load_calibration_cache(cache_file)
+    key = cache["profiles"].get(profile)
+    entry = cache["entries"].get(key) if key else None
+    return entry["pixel_to_mm"] if entry else None
+
+
+class PieceAnalysis:
+    """
+    Contexto de análise de uma peça em memória.
+
+    Guarda a imagem decodificada e os resultados intermediários (cinza, bordas,
+    maior contorno e caixa delimitadora). Cada etapa é calculada apenas na
+    primeira vez em que é acessada e reaproveitada por align_image,
+    get_piece_length e measure_diameters.
+
+    A imagem só é obrigatória quando acessada: subclasses que a geram sob
+    demanda (ContourAlignedAnalysis, MaskAnalysis) sobrescrevem a property image.
+
+    :param image_path: Caminho da imagem (usado para leitura, log e nomes de saída)
+    :param image: Imagem BGR já carregada (opcional, evita o cv2.imread)
+    :param output_tag: Sufixo inserido nos nomes de saída (ex.: '_ALIGN' gera '<nome>_ALIGN_L.png')
+    """
+
+    def __init__(self, image_path=None, image=None, blur_size=5, canny_threshold1=50, canny_threshold2=150,
+                 output_tag=""):
+        self.image_path = image_path
+        self.output_tag = output_tag
+        self.blur_size = blur_size
+        self.canny_threshold1 = canny_threshold1
+        self.canny_threshold2 = canny_threshold2
+        self._image = image
+        self._gray = None
+        self._blurred = None
+        self._edges = None
+        self._contours = None
+        self._contour = None
+        self._bounding_rect = None
+        self._profile = None
+        self._subpixel_profile = None
+        self._subpixel_span = None
+        # Últimas imagens anotadas geradas para esta peça (ex.: '_L', '_M')
+        self.annotations = {}
+
+    @property
+    def image(self):
+        if self._image is None:
+            if not self.image_path:
+                raise ValueError("Informe image_path ou image.")
+            with stage("imread") as timer:
+                self._image = timer.image = cv2.imread(self.image_path)
+        return self._image
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            image = self.image
+            with stage("gray", image):
+                self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def blurred(self):
+        if self._blurred is None:
+            gray = self.gray
+            with stage("blur", gray):
+                self._blurred = cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+        return self._blurred
+
+    @property
+    def edges(self):
+        if self._edges is None:
+            blurred = self.blurred
+            with stage("canny", blurred):
+                self._edges = cv2.Canny(blurred, self.canny_threshold1, self.canny_threshold2)
+        return self._edges
+
+    @property
+    def contours(self):
+        if self._contours is None:
+            edges = self.edges
+            with stage("find_contours", edges):
+                self._contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return self._contours
+
+    @property
+    def contour(self):
+        """Maior contorno (presumindo que seja a peça) ou None."""
+        if self._contour is None and self.contours:
+            self._contour = max(self.contours, key=cv2.contourArea)
+        return self._contour
+
+    @property
+    def bounding_rect(self):
+        if self._bounding_rect is None and self.contour is not None:
+            self._bounding_rect = cv2.boundingRect(self.contour)
+        return self._bounding_rect
+
+    @property
+    def length_px(self):
+        """Comprimento da peça em pixels (largura da caixa delimitadora) ou None."""
+        if self.bounding_rect is None:
+            return None
+        return self.bounding_rect[2]
+
+    @property
+    def profile(self):
+        """
+        Primeira e última linha de borda de cada coluna da caixa delimitadora,
+        calculadas em uma única passada (ver column_extents).
+
+        :return: (top, bottom, valid) em coordenadas absolutas da imagem
+        """
+        if self._profile is None and self.bounding_rect is not None:
+            x, y, w, h = self.bounding_rect
+            top, bottom, valid = column_extents(self.edges[y:y + h, x:x + w])
+            self._profile = (top + y, bottom + y, valid)
+        return self._profile
+
+    @property
+    def subpixel_profile(self):
+        """
+        Versão sub-pixel de profile: cada borda superior/inferior é refinada
+        pelo ajuste parabólico do perfil do gradiente vertical ao longo da coluna.
+
+        :return: (top, bottom, valid) com top/bottom em float
+        """
+        if self._subpixel_profile is None and self.profile is not None:
+            x, y, w, h = self.bounding_rect
+            top, bottom, valid = self.profile
+            # O refinamento parte do pixel mais próximo (o perfil pode estar em float)
+            top, bottom = np.rint(top).astype(int), np.rint(bottom).astype(int)
+            columns = np.arange(x, x + w)
+            gradient = np.abs(cv2.Sobel(self.blurred, cv2.CV_32F, 0, 1, ksize=3))
+            top_f = refine_edge_positions(gradient, top, columns)
+            bottom_f = refine_edge_positions(gradient, bottom, columns)
+            self._subpixel_profile = (top_f, bottom_f, valid)
+        return self._subpixel_profile
+
+    @property
+    def subpixel_span(self):
+        """
+        Bordas esquerda e direita da peça refinadas com o gradiente horizontal,
+        na linha em que o contorno atinge cada extremo.
+
+        :return: (x_esquerda, x_direita) em float
+        """
+        if self._subpixel_span is None and self.contour is not None:
+            points = self.contour.reshape(-1, 2)
+            x_min, x_max = points[:, 0].min(), points[:, 0].max()
+            row_left = int(np.median(points[points[:, 0] == x_min, 1]))
+            row_right = int(np.median(points[points[:, 0] == x_max, 1]))
+            # Transpor o gradiente horizontal para reaproveitar o refinamento por coluna
+            gradient = np.abs(cv2.Sobel(self.blurred, cv2.CV_32F, 1, 0, ksize=3)).T
+            left, right = refine_edge_positions(gradient, np.array([x_min, x_max]),
+                                                np.array([row_left, row_right]))
+            self._subpixel_span = (left, right)
+        return self._subpixel_span
+
+    def output_path(self, suffix):
+        """Caminho de saída derivado da imagem original (ex.: '_L.png')."""
+        if not self.image_path:
+            return None
+        base_name, _ = os.path.splitext(self.image_path)
+        return base_name + self.output_tag + suffix
+
+
+class ContourAlignedAnalysis(PieceAnalysis):
+    """
+    Análise alinhada obtida rotacionando apenas os pontos do contorno.
+
+    O contorno é levado ao referencial do minAreaRect (peça na horizontal) e
+    transladado para um recorte do tamanho da peça mais uma margem. Comprimento
+    e diâmetros saem do próprio contorno rotacionado, mantido em float (ver
+    polygon_column_extents), de modo que não exigem o warpAffine da imagem nem
+    perdem precisão no arredondamento dos vértices. A imagem alinhada só é
+    gerada (recortada à região da peça) quando algo a acessa, por exemplo para
+    desenhar as anotações.
+
+    :param source: PieceAnalysis da imagem original
+    :param M: Matriz de rotação 2x3 no referencial da imagem original
+    :param margin: Margem em pixels ao redor da peça no recorte
+    """
+
+    def __init__(self, source, M, margin=ALIGN_MARGIN):
+        # A imagem alinhada é gerada sob demanda (property image)
+        super().__init__(image_path=source.image_path,
+                         blur_size=source.blur_size,
+                         canny_threshold1=source.canny_threshold1,
+                         canny_threshold2=source.canny_threshold2,
+                         output_tag=source.output_tag + "_ALIGN")
+        self.source = source
+        
+        # Rotacionar somente os pontos do contorno
+        rotated = cv2.transform(source.contour.astype(np.float64), M)
+        x_min, y_min = np.floor(rotated.reshape(-1, 2).min(axis=0))
+        x_max, y_max = np.ceil(rotated.reshape(-1, 2).max(axis=0))
+        
+        # Transladar para o recorte (peça + margem)
+        self.M = M.copy()
+        self.M[0, 2] -= x_min - margin
+        self.M[1, 2] -= y_min - margin
+        self.size = (int(x_max - x_min) + 2 * margin + 1, int(y_max - y_min) + 2 * margin + 1)
+        
+        contour = cv2.transform(source.contour.astype(np.float64), self.M)
+        # Vértices em float para a medição; a versão inteira serve à caixa delimitadora e aos desenhos
+        self.polygon = contour.reshape(-1, 2)
+        self._contour = np.round(contour).astype(np.int32)
+        self._contours = (self._contour,)
+
+    @property
+    def image(self):
+        if self._image is None:
+            # Warp apenas da região da peça, sob demanda
+            source_image = self.source.image
+            with stage("warp_affine", source_image):
+                self._image = cv2.warpAffine(source_image, self.M, self.size,
+                                             flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+        return self._image
+
+    @property
+    def length_px(self):
+        # Mesma convenção de boundingRect (largura = extensão + 1), sem arredondar os vértices
+        if self.bounding_rect is None:
+            return None
+        return float(np.ptp(self.polygon[:, 0])) + 1
+
+    @property
+    def profile(self):
+        """
+        Interseções de cada coluna com o contorno rotacionado em float. As colunas
+        partem da borda esquerda real do contorno, então o perfil não depende da
+        translação do recorte nem do centro da rotação.
+
+        :return: (top, bottom, valid) com top/bottom em float
+        """
+        if self._profile is None and self.bounding_rect is not None:
+            _, _, w, _ = self.bounding_rect
+            self._profile = polygon_column_extents(self.polygon, self.polygon[:, 0].min(), w)
+        return self._profile
+
+    @property
+    def edges(self):
+        if self._edges is None:
+            # Contorno rotacionado rasterizado (a medição usa o polígono em float, ver profile)
+            w, h = self.size
+            self._edges = np.zeros((h, w), np.uint8)
+            cv2.polylines(self._edges, [self._contour], True, 255, 1)
+        return self._edges
+
+
+class MaskAnalysis(PieceAnalysis):
+    """
+    Análise de uma peça a partir de uma máscara binária de qualquer método de
+    segmentação (ver segmentation.py), em vez do Canny sobre a imagem.
+
+    O contorno, a caixa delimitadora e o perfil de diâmetros saem da própria
+    máscara, de modo que align_piece, get_piece_length, sample_diameters e
+    measure_diameters funcionam sem alterações.
+
+    :param mask: Máscara uint8 (peça > 0)
+    :param image: Imagem BGR correspondente (anotações e refinamento sub-pixel); se None, usa a máscara
+    :param image_path: Caminho da imagem (log e nomes de saída)
+    :param blur_size, canny_threshold1, canny_threshold2: Como em PieceAnalysis; o desfoque
+                                                          é usado no refinamento sub-pixel
+    """
+
+    def __init__(self, mask, image=None, image_path=None, output_tag="", blur_size=5, canny_threshold1=50,
+                 canny_threshold2=150):
+        super().__init__(image_path=image_path, image=image, blur_size=blur_size,
+                         canny_threshold1=canny_threshold1, canny_threshold2=canny_threshold2,
+                         output_tag=output_tag)
+        self.mask = np.where(mask > 0, 255, 0).astype(np.uint8)
+
+    @property
+    def image(self):
+        if self._image is None and not self.image_path:
+            # Sem imagem nem caminho: a própria máscara serve às anotações
+            self._image = cv2.cvtColor(self.mask, cv2.COLOR_GRAY2BGR)
+        return super().image
+
+    @property
+    def edges(self):
+        # A máscara preenchida tem as mesmas bordas externas e os mesmos extremos por coluna
+        return self.mask
+
+
+class RoiTracker:
+    """
+    Restringe a análise à região da peça (ROI) em imagens sucessivas do mesmo dispositivo.
+
+    Na primeira imagem a peça é localizada no quadro inteiro; nas seguintes,
+    desfoque, Canny e busca de contornos rodam apenas no recorte da última
+    caixa delimitadora mais uma margem. Se a peça não for encontrada no
+    recorte ou encostar na borda dele (peça deslocada), a busca é refeita no
+    quadro inteiro. No modo de alinhamento 'contour' as medições não dependem
+    da translação nem do centro da rotação, então sobre o recorte são as mesmas
+    do quadro inteiro; no modo 'warp' a imagem é reamostrada em torno do centro
+    do recorte e os valores podem variar de um pixel.
+
+    :param margin: Margem em pixels ao redor da última caixa delimitadora
+    :param size_tolerance: Variação relativa máxima de largura/altura da peça entre
+                           imagens; acima disso o recorte pegou outro objeto
+    :param analysis_params: Parâmetros repassados ao PieceAnalysis (blur_size, canny_threshold1, ...)
+    """
+
+    def __init__(self, margin=40, size_tolerance=0.2, **analysis_params):
+        self.margin = margin
+        self.size_tolerance = size_tolerance
+        self.analysis_params = analysis_params
+        self.rect = None  # Caixa delimitadora (x, y, w, h) da peça no quadro inteiro
+        self.offset = (0, 0)  # Canto superior esquerdo do último recorte
+        self.full_searches = 0
+
+    def reset(self):
+        """Esquece a posição da peça (ex.: troca de dispositivo)."""
+        self.rect = None
+
+    def _window(self, shape):
+        x, y, w, h = self.rect
+        frame_h, frame_w = shape[:2]
+        return (max(x - self.margin, 0), max(y - self.margin, 0),
+                min(x + w + self.margin, frame_w), min(y + h + self.margin, frame_h))
+
+    def _locate(self, image_path, image, window):
+        x0, y0, x1, y1 = window
+        if x1 <= x0 or y1 <= y0:
+            return None  # Janela fora do quadro (ex.: quadro menor que o anterior)
+        analysis = PieceAnalysis(image_path=image_path, image=image[y0:y1, x0:x1], **self.analysis_params)
+        if analysis.contour is None:
+            return None
+
+        # Peça encostada na borda do recorte (que não é a borda do quadro): saiu da ROI
+        x, y, w, h = analysis.bounding_rect
+        frame_h, frame_w = image.shape[:2]
+        if ((x == 0 and x0 > 0) or (y == 0 and y0 > 0) or
+                (x + w >= x1 - x0 and x1 < frame_w) or (y + h >= y1 - y0 and y1 < frame_h)):
+            return None
+
+        # Objeto de tamanho muito diferente da peça anterior: não é a mesma peça
+        if self.rect is not None:
+            _, _, last_w, last_h = self.rect
+            if (abs(w - last_w) > self.size_tolerance * last_w or
+                    abs(h - last_h) > self.size_tolerance * last_h):
+                return None
+
+        self.offset = (x0, y0)
+        self.rect = (x + x0, y + y0, w, h)
+        return analysis
+
+    def analyze(self, source):
+        """
+        Análise da peça restrita à ROI.
+
+        :param source: Caminho da imagem ou imagem BGR (array)
+        :return: PieceAnalysis sobre o recorte (coordenadas relativas a self.offset)
+                 ou None se nenhuma peça for encontrada
+        """
+        if isinstance(source, np.ndarray):
+            image_path, image = None, source
+        else:
+            with stage("imread") as timer:
+                image_path, image = source, cv2.imread(source)
+                timer.image = image
+            if image is None:
+                return None
+
+        if self.rect is not None:
+            analysis = self._locate(image_path, image, self._window(image.shape))
+            if analysis is not None:
+                return analysis
+
+        # Primeira imagem ou peça perdida: procurar no quadro inteiro
+        self.full_searches += 1
+        self.rect = None
+        frame_h, frame_w = image.shape[:2]
+        analysis = self._locate(image_path, image, (0, 0, frame_w, frame_h))
+        if analysis is None:
+            return None
+
+        # Recortar já a partir desta imagem, para que o processamento seguinte seja igual
+        return self._locate(image_path, image, self._window(image.shape)) or analysis
+
+
+def column_extents(binary):
+    """
+    Primeira e última linha não nula de todas as colunas de uma imagem binária,
+    sem laço em Python (argmax na imagem e na sua cópia invertida verticalmente).
+
+    :param binary: Imagem 2D (bordas ou máscara)
+    :return: (top, bottom, valid); valid indica colunas com ao menos dois pixels
+             distintos (mesmo critério do antigo len(scan_line) >= 2)
+    """
+    nonzero = binary > 0
+    top = nonzero.argmax(axis=0)
+    bottom = nonzero.shape[0] - 1 - nonzero[::-1].argmax(axis=0)
+    valid = nonzero.any(axis=0) & (bottom > top)
+    return top, bottom, valid
+
+
+def polygon_column_extents(polygon, x_start, width):
+    """
+    Primeira e última interseção das colunas x_start + i (i < width) com as
+    arestas de um polígono fechado de vértices em float, sem rasterizar.
+
+    :param polygon: Vértices (N x 2) em float
+    :param x_start: Abscissa da primeira coluna
+    :param width: Número de colunas
+    :return: (top, bottom, valid) com top/bottom em float (0 nas colunas inválidas);
+             valid indica colunas com duas interseções distintas
+    """
+    p0 = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    p1 = np.roll(p0, -1, axis=0)
+    
+    # Colunas cobertas por cada aresta (cada vértice é coberto pela aresta que começa nele)
+    first = np.clip(np.ceil(np.minimum(p0[:, 0], p1[:, 0]) - x_start), 0, width).astype(int)
+    last = np.clip(np.floor(np.maximum(p0[:, 0], p1[:, 0]) - x_start), -1, width - 1).astype(int)
+    counts = np.maximum(last - first + 1, 0)
+    edge = np.repeat(np.arange(len(p0)), counts)
+    column = first[edge] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    x0, y0 = p0[edge, 0], p0[edge, 1]
+    dx, dy = p1[edge, 0] - x0, p1[edge, 1] - y0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(dx != 0, (x_start + column - x0) / dx, 0.0)
+    rows = y0 + t * dy
+    
+    top = np.full(width, np.inf)
+    bottom = np.full(width, -np.inf)
+    np.minimum.at(top, column, rows)
+    np.maximum.at(bottom, column, rows)
+    valid = bottom > top
+    top[~valid] = 0
+    bottom[~valid] = 0
+    return top, bottom, valid
+
+
+def refine_edge_positions(gradient, rows, columns, radius=2):
+    """
+    Localização sub-pixel de bordas ao longo de colunas.
+
+    Para cada (linha, coluna) procura o máximo do gradiente numa janela de
+    +-radius linhas e ajusta uma parábola aos três valores em torno do pico.
+
+    :param gradient: Magnitude do gradiente na direção das colunas (2D)
+    :param rows: Linhas inteiras das bordas detectadas
+    :param columns: Colunas correspondentes
+    :return: Linhas refinadas (float)
+    """
+    rows = np.asarray(rows)
+    columns = np.asarray(columns)
+    h = gradient.shape[0]
+    window = np.clip(rows[:, None] + np.arange(-radius, radius + 1)[None, :], 1, h - 2)
+    peak = window[np.arange(len(rows)), gradient[window, columns[:, None]].argmax(axis=1)]
+    
+    g0 = gradient[peak - 1, columns]
+    g1 = gradient[peak, columns]
+    g2 = gradient[peak + 1, columns]
+    denom = g0 - 2 * g1 + g2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(denom < 0, 0.5 * (g0 - g2) / denom, 0.0)
+    return peak + np.clip(delta, -0.5, 0.5)
+
+
+def diameter_profile(source, pixel_to_mm_ratio, subpixel=False):
+    """
+    Perfil completo de diâmetros: um valor por coluna da caixa delimitadora.
+
+    :param source: Caminho da imagem alinhada, array ou PieceAnalysis
+    :param pixel_to_mm_ratio: Relação pixels/mm da calibração
+    :param subpixel: Se True, usa as bordas refinadas (PieceAnalysis.subpixel_profile)
+    :return: (posições em mm a partir da borda esquerda, diâmetros em mm com NaN
+             onde não há borda) ou None se nenhum contorno for encontrado
+    """
+    analysis = _as_analysis(source)
+    if analysis.profile is None:
         print("Nenhum contorno detectado!")
         return None
     
-    # Selecionar o maior contorno (presumindo que seja a peça)
-    contour = max(contours, key=cv2.contourArea)
+    top, bottom, valid = analysis.subpixel_profile if subpixel else analysis.profile
+    diameters = np.where(valid, bottom - top, np.nan) / pixel_to_mm_ratio
+    positions = np.arange(len(diameters)) / pixel_to_mm_ratio
+    return positions, diameters
+
+
+def _lookup_profile(analysis, pixel_to_mm_ratio, positions_mm, interpolate=False, subpixel=False):
+    """
+    Consulta o perfil nas posições pedidas.
+
+    :return: Lista de (posição em mm, x_pos, top, bottom, diâmetro em pixels) das posições válidas
+    """
+    x, y, w, h = analysis.bounding_rect
+    top, bottom, valid = analysis.subpixel_profile if subpixel else analysis.profile
+    positions_mm = np.asarray(positions_mm, dtype=np.float64)
+    offsets = positions_mm * pixel_to_mm_ratio
+    columns = offsets.astype(int)
+    inside = (offsets >= 0) & (columns < w)
+    
+    diameters = np.full(len(offsets), np.nan)
+    if interpolate:
+        # Interpolação linear entre as colunas válidas vizinhas
+        valid_cols = np.flatnonzero(valid)
+        if len(valid_cols):
+            diameters[inside] = np.interp(offsets[inside], valid_cols, (bottom - top)[valid_cols],
+                                          left=np.nan, right=np.nan)
+        inside &= ~np.isnan(diameters)
+    else:
+        inside[inside] &= valid[columns[inside]]
+        diameters[inside] = (bottom - top)[columns[inside]]
+    
+    return [(float(positions_mm[i]), x + col, top[col], bottom[col], diameters[i])
+            for i, col in enumerate(columns) if inside[i]]
+
+
+def sample_diameters(source, pixel_to_mm_ratio, positions_mm, interpolate=False, subpixel=False):
+    """
+    Diâmetros nas posições pedidas, consultados no perfil da peça, sem log nem
+    imagem anotada. Posições fora da peça ou sem borda são omitidas.
+
+    :return: Lista de (posição em mm, diâmetro em mm) ou None se nenhum contorno for encontrado
+    """
+    analysis = _as_analysis(source)
+    if analysis.profile is None:
+        print("Nenhum contorno detectado!")
+        return None
+    
+    stations = _lookup_profile(analysis, pixel_to_mm_ratio, positions_mm, interpolate, subpixel)
+    return [(pos_mm, diameter_px / pixel_to_mm_ratio) for pos_mm, _, _, _, diameter_px in stations]
+
+
+def _as_analysis(source):
+    """Aceita um caminho de imagem, uma imagem BGR (array) ou um PieceAnalysis."""
+    if isinstance(source, PieceAnalysis):
+        return source
+    if isinstance(source, np.ndarray):
+        return PieceAnalysis(image=source)
+    return PieceAnalysis(image_path=source)
+
+
+def _alignment_matrix(analysis):
+    """Matriz de rotação que deixa o maior contorno na horizontal, ou None."""
+    contour = analysis.contour
+    
+    if contour is None:
+        print("Nenhum contorno detectado!")
+        return None
     
     # Obter a caixa delimitadora rotacionada
     rect = cv2.minAreaRect(contour)
@@ -145,146 +872,271 @@ def align_image(image_path):
     elif angle > 45:
         angle -= 90
     
+    (h, w) = analysis.image.shape[:2]
+    center = (w // 2, h // 2)
+    return cv2.getRotationMatrix2D(center, angle, 1.0)
+
+def align_array(source):
+    """
+    Alinha a peça na horizontal inteiramente em memória.
+
+    :param source: Imagem BGR (array), caminho ou PieceAnalysis
+    :return: (imagem rotacionada, matriz de rotação 2x3) ou (None, None)
+    """
+    analysis = _as_analysis(source)
+    M = _alignment_matrix(analysis)
+    if M is None:
+        return None, None
+    
     # Rotacionar a imagem
+    image = analysis.image
     (h, w) = image.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
     
-    # Salvar a imagem alinhada
-    output_path = image_path.replace(".png", "_ALIGN.png")
-    cv2.imwrite(output_path, rotated)
-    print(f"Imagem alinhada salva como: {output_path}")
+    # Se a peça rotacionada não couber na imagem (ex.: recorte justo do RoiTracker),
+    # ampliar a tela em vez de cortar as pontas; caso contrário nada muda
+    rotated_contour = cv2.transform(analysis.contour.astype(np.float64), M).reshape(-1, 2)
+    x_min, y_min = np.floor(rotated_contour.min(axis=0)) - ALIGN_MARGIN
+    x_max, y_max = np.ceil(rotated_contour.max(axis=0)) + ALIGN_MARGIN
+    if x_min < 0 or y_min < 0 or x_max >= w or y_max >= h:
+        shift_x, shift_y = max(0, -x_min), max(0, -y_min)
+        M = M.copy()
+        M[0, 2] += shift_x
+        M[1, 2] += shift_y
+        w = int(max(w, x_max + 1) + shift_x)
+        h = int(max(h, y_max + 1) + shift_y)
+    
+    with stage("warp_affine", image):
+        rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
     
-    return output_path
+    return rotated, M
 
-def get_piece_length(image_path, pixel_to_mm_ratio):
-    # Carregar a imagem
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def align_piece(source, save_output=False, mode="warp"):
+    """
+    Alinha a peça e devolve uma nova análise sobre a imagem alinhada, sem
+    passar pelo disco. A gravação de '<nome>_ALIGN.png' é opcional (auditoria).
+
+    :param source: Imagem BGR (array), caminho ou PieceAnalysis
+    :param save_output: Se True, grava também a imagem alinhada em disco
+    :param mode: 'warp' rotaciona a imagem inteira; 'contour' rotaciona só o
+                 contorno e mede no referencial do minAreaRect (ver ContourAlignedAnalysis)
+    :return: (PieceAnalysis da imagem alinhada, matriz de rotação 2x3) ou (None, None)
+    """
+    analysis = _as_analysis(source)
     
-    # Aplicar um filtro Gaussiano para suavizar a imagem
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    if mode == "contour":
+        M = _alignment_matrix(analysis)
+        if M is None:
+            return None, None
+        aligned = ContourAlignedAnalysis(analysis, M)
+    elif mode == "warp" and isinstance(analysis, MaskAnalysis):
+        # A máscara é rotacionada junto com a imagem, sem refazer a segmentação
+        rotated, M = align_array(analysis)
+        if rotated is None:
+            return None, None
+        (h, w) = rotated.shape[:2]
+        with stage("warp_affine", analysis.mask):
+            rotated_mask = cv2.warpAffine(analysis.mask, M, (w, h), flags=cv2.INTER_NEAREST)
+        aligned = MaskAnalysis(rotated_mask, image=rotated, image_path=analysis.image_path,
+                               output_tag=analysis.output_tag + "_ALIGN", blur_size=analysis.blur_size,
+                               canny_threshold1=analysis.canny_threshold1,
+                               canny_threshold2=analysis.canny_threshold2)
+    elif mode == "warp":
+        rotated, M = align_array(analysis)
+        if rotated is None:
+            return None, None
+        aligned = PieceAnalysis(image_path=analysis.image_path, image=rotated,
+                                blur_size=analysis.blur_size,
+                                canny_threshold1=analysis.canny_threshold1,
+                                canny_threshold2=analysis.canny_threshold2,
+                                output_tag=analysis.output_tag + "_ALIGN")
+    else:
+        raise ValueError(f"Modo de alinhamento desconhecido: {mode}")
     
-    # Detectar bordas usando Canny
-    edges = cv2.Canny(blurred, 50, 150)
+    if save_output:
+        output_path = analysis.output_path("_ALIGN.png")
+        if output_path:
+            cv2.imwrite(output_path, aligned.image)
+            print(f"Imagem alinhada salva como: {output_path}")
     
-    # Encontrar contornos
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return aligned, M
+
+def align_image(source):
+    """
+    Alinha a peça na horizontal e salva a imagem como '<nome>_ALIGN.png'.
+
+    :param source: Caminho da imagem ou PieceAnalysis
+    :return: Caminho da imagem alinhada
+    """
+    analysis = _as_analysis(source)
+    aligned, _ = align_piece(analysis, save_output=True)
+    if aligned is None:
+        return None
     
-    if not contours:
+    return analysis.output_path("_ALIGN.png")
+
+def get_piece_length(source, pixel_to_mm_ratio, annotate=True, subpixel=False):
+    """
+    Mede o comprimento total da peça (largura da caixa delimitadora).
+
+    :param source: Caminho da imagem alinhada ou PieceAnalysis
+    :param pixel_to_mm_ratio: Relação pixels/mm da calibração
+    :param annotate: Se False, não gera nem salva a imagem anotada '_L.png'
+    :param subpixel: Se True, mede a distância entre as bordas esquerda e direita
+                     refinadas pelo gradiente (PieceAnalysis.subpixel_span)
+    """
+    analysis = _as_analysis(source)
+    
+    if analysis.contour is None:
         print("Nenhum contorno detectado!")
         return None
     
-    # Selecionar o maior contorno (presumindo que seja a peça)
-    contour = max(contours, key=cv2.contourArea)
-    x, y, w, h = cv2.boundingRect(contour)
+    x, y, w, h = analysis.bounding_rect
     
-    # Converter largura de pixels para mm (usando w para o comprimento)
-    length_mm = w / pixel_to_mm_ratio
+    # Converter largura de pixels para mm (ver PieceAnalysis.length_px)
+    if subpixel:
+        left, right = analysis.subpixel_span
+        length_mm = (right - left) / pixel_to_mm_ratio
+    else:
+        length_mm = analysis.length_px / pixel_to_mm_ratio
     print(f"Comprimento total da peça: {length_mm:.3f}mm")
     
     # Registrar no log
-    log_measurement(image_path, "Comprimento Total", [length_mm])
+    log_measurement(analysis.image_path, "Comprimento Total", [length_mm])
+    
+    if not annotate:
+        return length_mm
     
-        # Criar uma cópia da imagem para sobrepor a linha de comprimento
-    output_image = image.copy()
+    # Criar uma cópia da imagem para sobrepor a linha de comprimento
+    output_image = analysis.image.copy()
     font_scale = get_text_scale(w, h)
     cv2.line(output_image, (x, y + h // 2), (x + w, y + h // 2), (255, 0, 0), 2)
     cv2.putText(output_image, f"{length_mm:.3f}mm", (x + w // 2, y + h // 2 - 10),
                 cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 255), 2, cv2.LINE_AA)
     
-    # Salvar a imagem com a linha sobreposta
-    output_path = image_path.replace(".png", "_L.png")
-    cv2.imwrite(output_path, output_image)
-    print(f"Imagem salva com comprimento identificado: {output_path}")
+    analysis.annotations["_L"] = output_image
+    
+    # Salvar a imagem com a linha sobreposta (em segundo plano, conforme o nível do artifacts)
+    output_path = save_artifact(analysis.output_path("_L.png"), output_image,
+                                source=analysis.image_path, copy=False)
+    if output_path:
+        print(f"Imagem salva com comprimento identificado: {output_path}")
     
     return length_mm
 
-def measure_diameters(image_path, pixel_to_mm_ratio, positions_mm):
-    # Carregar a imagem
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Aplicar um filtro Gaussiano para suavizar a imagem
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Detectar bordas usando Canny
-    edges = cv2.Canny(blurred, 50, 150)
-    
-    # Encontrar contornos
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def measure_diameters(source, pixel_to_mm_ratio, positions_mm, annotate=True, interpolate=False, subpixel=False,
+                      return_positions=False):
+    """
+    Mede os diâmetros da peça nas posições indicadas (em mm a partir da borda esquerda).
+
+    As posições são consultadas no perfil completo da peça (PieceAnalysis.profile),
+    portanto o custo praticamente não depende do número de estações. Posições
+    fora da peça ou sem borda são ignoradas.
+
+    :param source: Caminho da imagem alinhada ou PieceAnalysis
+    :param pixel_to_mm_ratio: Relação pixels/mm da calibração
+    :param positions_mm: Posições de medição em mm
+    :param annotate: Se False, não gera nem salva a imagem anotada '_M.png'
+    :param interpolate: Se True, interpola o perfil em posições fracionárias de pixel
+    :param subpixel: Se True, usa as bordas refinadas pelo gradiente (PieceAnalysis.subpixel_profile)
+    :param return_positions: Se True, a lista traz (posição em mm, diâmetro em mm), como em
+                             sample_diameters, já que posições inválidas são omitidas
+    :return: (lista de diâmetros em mm, caminho da imagem anotada ou None)
+    """
+    analysis = _as_analysis(source)
     
-    if not contours:
+    if analysis.contour is None:
         print("Nenhum contorno detectado!")
         return None
     
-    # Selecionar o maior contorno (presumindo que seja a peça)
-    contour = max(contours, key=cv2.contourArea)
-    x, y, w, h = cv2.boundingRect(contour)
+    x, y, w, h = analysis.bounding_rect
+    
+    # Perfil vetorizado calculado uma vez; as posições são apenas consultas
+    stations = _lookup_profile(analysis, pixel_to_mm_ratio, positions_mm, interpolate, subpixel)
     
     # Criar uma lista de medições para o log
-    measurements = []
+    measurements = [diameter_px / pixel_to_mm_ratio for _, _, _, _, diameter_px in stations]
     
-    for pos_mm in positions_mm:
-        pos_px = int(pos_mm * pixel_to_mm_ratio)
-        x_pos = x + pos_px
-        
-        # Encontrar a largura da peça na posição especificada
-        scan_line = np.where(edges[:, x_pos] > 0)[0]
-        if len(scan_line) >= 2:
-            diameter_px = scan_line[-1] - scan_line[0]
-            diameter_mm = diameter_px / pixel_to_mm_ratio
-            measurements.append(diameter_mm)
-    
-     # Criar uma cópia da imagem para sobrepor as medições
-    output_image = image.copy()
-    
-    for pos_mm in positions_mm:
-        pos_px = int(pos_mm * pixel_to_mm_ratio)
-        x_pos = x + pos_px
-        
-        # Encontrar a largura da peça na posição especificada
-        scan_line = np.where(edges[:, x_pos] > 0)[0]
-        if len(scan_line) >= 2:
-            diameter_px = scan_line[-1] - scan_line[0]
-            diameter_mm = diameter_px / pixel_to_mm_ratio
-            
-            # Desenhar linha vertical indicando a medição
-            cv2.line(output_image, (x_pos, scan_line[0]), (x_pos, scan_line[-1]), (0, 255, 0), 2)
-            font_scale = get_text_scale(w, h)
-            cv2.putText(output_image, f"{diameter_mm:.2f}mm", (x_pos + 5, scan_line[0] - 5),
-                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 255), 1, cv2.LINE_AA)
+    # Registrar no log
+    log_measurement(analysis.image_path, "Diâmetros", measurements)
+    result = [(pos_mm, d) for (pos_mm, _, _, _, _), d in zip(stations, measurements)] if return_positions else measurements
     
-    # Salvar a imagem com as medições sobrepostas
-    output_path = image_path.replace(".png", "_M.png")
-    cv2.imwrite(output_path, output_image)
-    print(f"Imagem salva com medições de diâmetro: {output_path}")
+    if not annotate:
+        return result, None
     
-    # Registrar no log
-    log_measurement(image_path, "Diâmetros", measurements)
+    # Criar uma cópia da imagem para sobrepor as medições
+    output_image = analysis.image.copy()
+    font_scale = get_text_scale(w, h)
+    
+    for (_, x_pos, y_top, y_bottom, _), diameter_mm in zip(stations, measurements):
+        # Desenhar linha vertical indicando a medição
+        cv2.line(output_image, (int(x_pos), int(y_top)), (int(x_pos), int(y_bottom)), (0, 255, 0), 2)
+        cv2.putText(output_image, f"{diameter_mm:.2f}mm", (int(x_pos) + 5, int(y_top) - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 255), 1, cv2.LINE_AA)
+    
+    analysis.annotations["_M"] = output_image
+    
+    # Salvar a imagem com as medições sobrepostas (em segundo plano, conforme o nível do artifacts)
+    output_path = save_artifact(analysis.output_path("_M.png"), output_image,
+                                source=analysis.image_path, copy=False)
+    if output_path:
+        print(f"Imagem salva com medições de diâmetro: {output_path}")
     
-    return measurements, output_path
+    return result, output_path
+
+
+def measure_piece(source, pixel_to_mm_ratio, num_stations=10, mode="contour", subpixel=False):
+    """
+    Alinha e mede uma peça sem imagens anotadas (lote e medição contínua).
+
+    O comprimento e os diâmetros em num_stations estações igualmente espaçadas
+    (mesmo critério da GUI) são registrados no log com o nome analysis.image_path.
+    Erros inesperados são propagados; quem chama decide se interrompe ou segue.
+
+    :param source: Caminho da imagem, array ou PieceAnalysis (ex.: de RoiTracker ou segmentation)
+    :return: Dicionário com imagem, comprimento e lista de (posição, diâmetro) em mm; se a
+             peça não for medida, comprimento None e 'error' com o motivo
+    """
+    analysis = _as_analysis(source)
+    result = {"image": analysis.image_path, "length_mm": None, "diameters": [], "error": None}
+    piece, _ = align_piece(analysis, mode=mode)
+    if piece is None:
+        result["error"] = "Falha no alinhamento"
+        return result
+    
+    length_mm = get_piece_length(piece, pixel_to_mm_ratio, annotate=False, subpixel=subpixel)
+    if not length_mm:
+        result["error"] = "Falha na medição do comprimento"
+        return result
+    result["length_mm"] = float(length_mm)
+    
+    passo = length_mm / num_stations
+    positions = np.arange(passo, length_mm + passo, passo)
+    stations = sample_diameters(piece, pixel_to_mm_ratio, positions, subpixel=subpixel) or []
+    result["diameters"] = [(float(p), float(d)) for p, d in stations]
+    log_measurement(analysis.image_path, "Diâmetros", [d for _, d in result["diameters"]])
+    return result
+
 
+if __name__ == "__main__":
+    image_path_calib = "./mnt/data/calibre.png"
+    pixel_to_mm_ratio = load_calibration()
+    if not pixel_to_mm_ratio:
+        pixel_to_mm_ratio = calibrate(image_path_calib)
+        print(f"Recalibrado:{pixel_to_mm_ratio}")
+        if pixel_to_mm_ratio:
+            save_calibration(pixel_to_mm_ratio)
+    else:
+        print(f"Calibracao recuperada:{pixel_to_mm_ratio}")
 
-image_path_calib = "./mnt/data/calibre.png"
-pixel_to_mm_ratio = load_calibration()
-if not pixel_to_mm_ratio:
-    pixel_to_mm_ratio = calibrate(image_path_calib)
-    print(f"Recalibrado:{pixel_to_mm_ratio}")
     if pixel_to_mm_ratio:
-        save_calibration(pixel_to_mm_ratio)
-else:
-    print(f"Calibracao recuperada:{pixel_to_mm_ratio}")
-
-if pixel_to_mm_ratio:
-    image_path_piece = align_image("./mnt/data/P1.png")
-    if image_path_piece:
-        tamanho = get_piece_length(image_path_piece, pixel_to_mm_ratio)
-        print(f"Tamnho medido :{tamanho}")
-        #measure_positions = [10, 20, 30, 40, 50]
-        passo = 30
-        measure_positions = np.arange(tamanho/passo, tamanho + (tamanho/passo), tamanho/passo)
-        medidas = measure_diameters(image_path_piece, pixel_to_mm_ratio, measure_positions)
-        print(f"Medidas:{medidas}")
+        # Alinhamento em memória: a análise alinhada é compartilhada entre comprimento e diâmetros
+        piece, _ = align_piece("./mnt/data/P1.png", mode="contour")
+        if piece:
+            tamanho = get_piece_length(piece, pixel_to_mm_ratio)
+            print(f"Tamnho medido :{tamanho}")
+            #measure_positions = [10, 20, 30, 40, 50]
+            passo = 30
+            measure_positions = np.arange(tamanho/passo, tamanho + (tamanho/passo), tamanho/passo)
+            medidas = measure_diameters(piece, pixel_to_mm_ratio, measure_positions)
+            print(f"Medidas:{medidas}")
 
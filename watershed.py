@@ -2,6 +2,11 @@ import cv2
 import numpy as np
 import os
 import json
+import time
+from watershed_engine import IncrementalWatershed, fill_holes
+
+# Tempo (s) sem mexer nos sliders antes de refazer a segmentação
+DEBOUNCE_SECONDS = 0.15
 
 # **Criar a interface gráfica antes de acessar os trackbars**
 cv2.namedWindow("Watershed Adjust", cv2.WINDOW_NORMAL)
@@ -12,9 +17,9 @@ cv2.resizeWindow("Watershed Adjust", 900, 600)
 cv2.resizeWindow("Controls", 300, 600)
 
 # **Criar os Trackbars antes de acessar seus valores**
-cv2.createTrackbar("Threshold", "Controls", 50, 255, lambda x: None)
-cv2.createTrackbar("Kernel Size", "Controls", 3, 10, lambda x: None)
-cv2.createTrackbar("Dist Transform", "Controls", 50, 100, lambda x: None)
+cv2.createTrackbar("Threshold", "Controls", 50, 255, lambda x: on_trackbar(x))
+cv2.createTrackbar("Kernel Size", "Controls", 3, 10, lambda x: on_trackbar(x))
+cv2.createTrackbar("Dist Transform", "Controls", 50, 100, lambda x: on_trackbar(x))
 
 # Arquivo para armazenar os parâmetros
 PARAMS_FILE = "watershed_params.json"
@@ -38,52 +43,21 @@ params = load_params()
 # Variáveis globais para salvar os resultados
 mask = None
 result = None
+engine = None
+pending_update = None  # Instante do último movimento de slider ainda não aplicado
 
-def update_watershed(val):
+def update_watershed(val=None):
     """Atualiza a segmentação Watershed com base nos parâmetros escolhidos pelo usuário."""
     
-    global mask, result  # Definir como global para que a função save_results() possa acessá-los
+    global mask, result, engine  # Definir como global para que a função save_results() possa acessá-los
     
-    # Carregar imagem original
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # Aplicar um desfoque para suavizar a segmentação
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-    # **Passo 1: Threshold**
-    _, thresh = cv2.threshold(blurred, params["Threshold"], 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-
-    # **Passo 2: Aplicar Morfologia para remover ruídos**
-    kernel = np.ones((params["Kernel Size"], params["Kernel Size"]), np.uint8)
-    opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
-
-    # **Passo 3: Criar a região segura de fundo**
-    sure_bg = cv2.dilate(opening, kernel, iterations=3)
-
-    # **Passo 4: Criar a região segura de primeiro plano**
-    dist_transform = cv2.distanceTransform(opening, cv2.DIST_L2, 5)
-    _, sure_fg = cv2.threshold(dist_transform, params["Dist Transform Factor"] * 0.01 * dist_transform.max(), 255, 0)
-
-    # **Passo 5: Encontrar regiões desconhecidas**
-    sure_fg = np.uint8(sure_fg)
-    unknown = cv2.subtract(sure_bg, sure_fg)
-
-    # **Passo 6: Criar marcadores para Watershed**
-    _, markers = cv2.connectedComponents(sure_fg)
-    markers = markers + 1
-    markers[unknown == 255] = 0
-
-    # **Passo 7: Aplicar Watershed**
-    markers = cv2.watershed(image, markers)
-    image[markers == -1] = [0, 0, 255]  # Marcar bordas em vermelho
-
-    # Criar máscara final
-    mask = np.zeros_like(gray)
-    mask[markers > 1] = 255
-
-    # **Passo 8: Aplicar a máscara na imagem original**
-    result = cv2.bitwise_and(image, image, mask=mask)
+    # Carregar a imagem original uma única vez; as etapas ficam em cache no engine
+    if engine is None:
+        engine = IncrementalWatershed(cv2.imread(image_path), params)
+    engine.set_params(**params)
+    
+    # **Passos 1 a 8: só as etapas afetadas pelo parâmetro alterado são recalculadas**
+    image, mask, result = engine.run()
 
     # **Passo 9: Exibir as imagens na interface**
     combined_top = cv2.resize(image, (display_width, display_height // 3))
@@ -94,11 +68,12 @@ def update_watershed(val):
     cv2.imshow("Watershed Adjust", combined)
 
 def on_trackbar(val):
-    """Atualiza os parâmetros e refaz a segmentação."""
+    """Atualiza os parâmetros; a segmentação é refeita no laço principal quando o slider para (debounce)."""
+    global pending_update
     params["Threshold"] = cv2.getTrackbarPos("Threshold", "Controls")
     params["Kernel Size"] = max(1, cv2.getTrackbarPos("Kernel Size", "Controls"))
     params["Dist Transform Factor"] = cv2.getTrackbarPos("Dist Transform", "Controls")
-    update_watershed(0)
+    pending_update = time.monotonic()
 
 def save_results():
     """Salva as imagens processadas e os parâmetros."""
@@ -128,35 +103,10 @@ def fill_mask(mask_path):
     # Carregar a máscara em escala de cinza
     mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
 
-    # **Passo 1: Inverter a máscara**
-    inverted_mask = cv2.bitwise_not(mask)
-
-    # **Passo 2: Criar uma cópia para manipulação**
-    filled_mask = inverted_mask.copy()
-
-    # **Passo 3: Criar uma máscara extra para Flood Fill**
-    h, w = mask.shape
-    floodfill_mask = np.zeros((h + 2, w + 2), np.uint8)
-
-    # **Passo 4: Aplicar Flood Fill no fundo preto (exterior)**
-    cv2.floodFill(filled_mask, floodfill_mask, (0, 0), 255)
-
-    # **Passo 5: Criar a máscara sólida inicial**
-    filled_mask = cv2.bitwise_not(filled_mask)
-    solid_mask = cv2.bitwise_or(mask, filled_mask)
-
-    # **Passo 6: Detectar buracos internos restantes**
-    contours, _ = cv2.findContours(solid_mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
-
-    # **Passo 7: Preencher todos os contornos internos**
-    for cnt in contours:
-        cv2.drawContours(solid_mask, [cnt], 0, 255, thickness=cv2.FILLED)
-
-    # **Passo 8: Aplicar operações morfológicas para suavizar**
-    kernel = np.ones((5, 5), np.uint8)
-    solid_mask = cv2.morphologyEx(solid_mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+    # **Preencher todos os buracos em uma passada e suavizar (ver watershed_engine.fill_holes)**
+    solid_mask = fill_holes(mask, close_iterations=2)
 
-    # **Passo 9: Salvar a máscara final**
+    # **Salvar a máscara final**
     base_name, _ = os.path.splitext(mask_path)
     output_path = base_name + "_solid_filled_fixed.jpg"
     cv2.imwrite(output_path, solid_mask)
@@ -176,6 +126,9 @@ update_watershed(0)
 while True:
     cv2.imshow("Controls", np.zeros((300, 300, 3), np.uint8))  # Janela vazia para exibir controles
     key = cv2.waitKey(1) & 0xFF
+    if pending_update is not None and time.monotonic() - pending_update >= DEBOUNCE_SECONDS:
+        pending_update = None
+        update_watershed(0)
     if key == 27:  # Tecla ESC para sair
         break
     elif key == ord('s') or  key == ord('S'):  # Tecla 's' para salvar
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+from batchutil import DERIVED_SUFFIXES, collect_images, run_pool
+
+# Parâmetros padrão da segmentação (mesmas chaves de watershed_params.json)
+DEFAULT_PARAMS = {"Threshold": 50, "Kernel Size": 3, "Dist Transform Factor": 50}
+PARAMS_FILE = "watershed_params.json"
+MASK_SUFFIX = "_watershed_mask.png"
+
+
+def _read_profiles(path):
+    """
+    Perfis de parâmetros do arquivo. Aceita o formato antigo (um único
+    dicionário de parâmetros, tratado como o perfil 'default') e o formato
+    {"profiles": {nome: parâmetros}}.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        data = json.load(f)
+    if "profiles" in data:
+        return data["profiles"]
+    return {"default": data}
+
+
+def load_params(profile="default", path=PARAMS_FILE, create=False):
+    """
+    Parâmetros de um perfil salvo pelo ajuste interativo (watershed_2.py).
+
+    :param profile: Nome do perfil (ex.: um por lote ou dispositivo)
+    :param path: Arquivo de parâmetros
+    :param create: Se True, um perfil ainda inexistente começa com os parâmetros
+                   do perfil 'default' (para ser criado pelo ajuste); se False, KeyError
+    :return: Dicionário completo de parâmetros (valores ausentes vêm de DEFAULT_PARAMS)
+    """
+    profiles = _read_profiles(path)
+    if profile not in profiles:
+        if profile != "default" and not create:
+            raise KeyError(f"Perfil de parâmetros desconhecido: {profile}")
+        profile = "default"
+    return dict(DEFAULT_PARAMS, **profiles.get(profile, {}))
+
+
+def save_params(params, profile="default", path=PARAMS_FILE):
+    """
+    Salva os parâmetros de um perfil. Enquanto só existir o perfil 'default',
+    o arquivo mantém o formato antigo (um único dicionário).
+    """
+    profiles = _read_profiles(path)
+    profiles[profile] = {key: params[key] for key in DEFAULT_PARAMS}
+    data = profiles["default"] if list(profiles) == ["default"] else {"profiles": profiles}
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+class IncrementalWatershed:
+    """
+    Segmentação Watershed com cache de cada etapa.
+
+    A imagem é carregada uma única vez e cada etapa guarda o resultado junto
+    com os parâmetros de que depende. Ao mudar um parâmetro, só as etapas a
+    jusante dele são recalculadas; por exemplo, mudar o fator da transformada
+    de distância refaz apenas o primeiro plano seguro, os marcadores e o
+    watershed, sem repetir desfoque, limiarização, morfologia e distância.
+
+    Etapas e dependências:
+        blurred  <- imagem
+        thresh   <- blurred, Threshold
+        opening  <- thresh, Kernel Size
+        sure_bg  <- opening, Kernel Size
+        dist     <- opening
+        sure_fg  <- dist, Dist Transform Factor
+        markers  <- sure_fg, sure_bg, imagem
+
+    :param image: Imagem BGR
+    :param params: Parâmetros iniciais (ver DEFAULT_PARAMS)
+    """
+
+    def __init__(self, image, params=None):
+        self.image = image
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self._cache = {}
+        self.recomputed = []  # Etapas recalculadas na última chamada de run()
+
+    def set_params(self, **params):
+        self.params.update(params)
+
+    def _stage(self, name, key, compute):
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = compute()
+        self._cache[name] = (key, value)
+        self.recomputed.append(name)
+        return value
+
+    @property
+    def blurred(self):
+        def compute():
+            gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            return cv2.GaussianBlur(gray, (5, 5), 0)
+        return self._stage("blurred", (), compute)
+
+    @property
+    def thresh(self):
+        threshold = self.params["Threshold"]
+        def compute():
+            _, thresh = cv2.threshold(self.blurred, threshold, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            return thresh
+        return self._stage("thresh", (threshold,), compute)
+
+    @property
+    def kernel(self):
+        size = max(1, self.params["Kernel Size"])
+        return np.ones((size, size), np.uint8)
+
+    @property
+    def opening(self):
+        key = (self.params["Threshold"], self.params["Kernel Size"])
+        return self._stage("opening", key,
+                           lambda: cv2.morphologyEx(self.thresh, cv2.MORPH_OPEN, self.kernel, iterations=2))
+
+    @property
+    def sure_bg(self):
+        key = (self.params["Threshold"], self.params["Kernel Size"])
+        return self._stage("sure_bg", key, lambda: cv2.dilate(self.opening, self.kernel, iterations=3))
+
+    @property
+    def dist(self):
+        key = (self.params["Threshold"], self.params["Kernel Size"])
+        return self._stage("dist", key, lambda: cv2.distanceTransform(self.opening, cv2.DIST_L2, 5))
+
+    @property
+    def sure_fg(self):
+        factor = self.params["Dist Transform Factor"]
+        key = (self.params["Threshold"], self.params["Kernel Size"], factor)
+        def compute():
+            dist = self.dist
+            _, sure_fg = cv2.threshold(dist, factor * 0.01 * dist.max(), 255, 0)
+            return np.uint8(sure_fg)
+        return self._stage("sure_fg", key, compute)
+
+    @property
+    def markers(self):
+        key = (self.params["Threshold"], self.params["Kernel Size"], self.params["Dist Transform Factor"])
+        def compute():
+            sure_fg = self.sure_fg
+            unknown = cv2.subtract(self.sure_bg, sure_fg)
+            _, markers = cv2.connectedComponents(sure_fg)
+            markers = markers + 1
+            markers[unknown == 255] = 0
+            return cv2.watershed(self.image, markers)
+        return self._stage("markers", key, compute)
+
+    def run(self):
+        """
+        Atualiza a segmentação com os parâmetros atuais.
+
+        :return: (imagem com as bordas em vermelho, máscara, imagem mascarada)
+        """
+        self.recomputed = []
+        markers = self.markers
+
+        # A imagem em cache não é alterada: as bordas são desenhadas numa cópia
+        overlay = self.image.copy()
+        overlay[markers == -1] = [0, 0, 255]
+
+        mask = np.zeros(markers.shape, np.uint8)
+        mask[markers > 1] = 255
+        result = cv2.bitwise_and(overlay, overlay, mask=mask)
+        return overlay, mask, result
+
+
+def fill_holes(mask, close_iterations=0, close_kernel_size=5):
+    """
+    Preenche todos os buracos de uma máscara binária em uma única passada.
+
+    A máscara ganha uma moldura de fundo de 1 pixel e um único floodFill a
+    partir da moldura marca todo o fundo ligado à borda da imagem (exterior);
+    o fundo que sobra são os buracos. Não depende de o canto (0, 0) ser fundo
+    nem de uma semente no centro, e não redesenha contorno por contorno.
+
+    :param mask: Máscara uint8 (peça > 127; tolera o ruído de máscaras gravadas em JPEG)
+    :param close_iterations: Iterações de fechamento morfológico após o preenchimento (0 = nenhuma)
+    :param close_kernel_size: Tamanho do elemento estruturante do fechamento
+    :return: Nova máscara 0/255 com os buracos preenchidos
+    """
+    _, binary = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+    exterior = cv2.copyMakeBorder(binary, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(exterior, None, (0, 0), 255)
+
+    # Tudo o que o exterior não alcançou é peça ou buraco
+    filled = cv2.bitwise_not(exterior[1:-1, 1:-1]) | binary
+    if close_iterations:
+        kernel = np.ones((close_kernel_size, close_kernel_size), np.uint8)
+        filled = cv2.morphologyEx(filled, cv2.MORPH_CLOSE, kernel, iterations=close_iterations)
+    return filled
+
+
+def segment(image, params=None):
+    """
+    Segmentação Watershed de uma imagem em memória, sem janelas nem arquivos.
+
+    :param image: Imagem BGR
+    :param params: Dicionário de parâmetros (ver load_params); None usa DEFAULT_PARAMS
+    :return: (máscara binária uint8 0/255, marcadores do watershed)
+    """
+    engine = IncrementalWatershed(image, params)
+    markers = engine.markers
+    mask = np.zeros(markers.shape, np.uint8)
+    mask[markers > 1] = 255
+    return mask, markers
+
+
+def segment_file(image_path, params=None, write_mask=True):
+    """
+    Segmenta uma imagem do disco (executado em um processo do pool).
+
+    :param write_mask: Se True, grava '<nome>_watershed_mask.png' ao lado da imagem
+    :return: Dicionário com imagem, caminho da máscara, fração de pixels da peça e erro
+    """
+    result = {"image": image_path, "mask_path": None, "foreground": None, "error": None}
+    try:
+        image = cv2.imread(image_path)
+        if image is None:
+            result["error"] = "Falha ao ler a imagem"
+            return result
+        mask, _ = segment(image, params)
+        result["foreground"] = float(np.count_nonzero(mask)) / mask.size
+        if write_mask:
+            mask_path = os.path.splitext(image_path)[0] + MASK_SUFFIX
+            cv2.imwrite(mask_path, mask)
+            result["mask_path"] = mask_path
+    except Exception as exc:  # Uma imagem ruim não deve derrubar o lote inteiro
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def segment_batch(image_paths, params=None, workers=None, write_mask=True):
+    """
+    Segmenta as imagens em um pool de processos.
+
+    :param workers: Número de processos (padrão: número de núcleos)
+    :return: Lista de resultados (ver segment_file) na ordem de conclusão
+    """
+    return run_pool(segment_file, image_paths, (params, write_mask), workers,
+                    describe=lambda result: f"peça em {result['foreground']:.1%} da imagem")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Segmentação Watershed em lote, sem interface gráfica.")
+    parser.add_argument("inputs", nargs="+", help="Diretórios, arquivos ou padrões glob das imagens")
+    parser.add_argument("--params", default=PARAMS_FILE, help="Arquivo de parâmetros do ajuste interativo")
+    parser.add_argument("--profile", default="default", help="Perfil de parâmetros")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="Número de processos (padrão: núcleos)")
+    parser.add_argument("--no-write", action="store_true", help="Não gravar as máscaras (só estatísticas)")
+    args = parser.parse_args(argv)
+
+    params = load_params(args.profile, args.params)
+    # Sem as imagens derivadas nem as máscaras já geradas
+    image_paths = collect_images(args.inputs, DERIVED_SUFFIXES + (os.path.splitext(MASK_SUFFIX)[0],))
+    if not image_paths:
+        print("Nenhuma imagem encontrada.")
+        return 1
+    print(f"{len(image_paths)} imagens, parâmetros {params}")
+
+    results = segment_batch(image_paths, params, args.workers, not args.no_write)
+    failures = sum(1 for result in results if result["error"])
+    print(f"Lote concluído: {len(results) - failures} máscaras, {failures} falhas.")
+    return 0 if not failures else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())